@@ -1,10 +1,21 @@
+import os
 import sys
+import time
 import winreg
 import json
+import struct
+import tempfile
+import zlib
 from pathlib import Path
 from pkgutil import iter_modules
 from platform import system
 
+# Platform specific imports
+try:
+    import msvcrt
+except ImportError:
+    import fcntl
+
 # Third party imports
 import numpy as np
 from si_prefix import si_parse
@@ -24,6 +35,218 @@ class NpEncoder(json.JSONEncoder):
             return super(NpEncoder, self).default(obj)
 
 
+# Versioned settings container. Scalars and strings are stored as JSON, while NumPy arrays, raw bytes and table grids
+# are stored as little-endian buffers after the JSON block, described by dtype/shape headers in the JSON itself
+SETTINGS_MAGIC = b'T2WS'
+SETTINGS_VERSION = 1
+SETTINGS_HEADER = struct.Struct('<4sBI')    # Magic, version, JSON block length
+SETTINGS_ALIGNMENT = 8
+
+
+def _is_table_grid(value):
+    # Rectangular list of rows containing only text/empty cells (what get_widget_value returns for text tables)
+    if not value or not all(isinstance(row, list) and row and len(row) == len(value[0]) for row in value):
+        return False
+
+    return all(cell is None or isinstance(cell, str) for row in value for cell in row)
+
+
+def _pack_settings(value, buffers):
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        buffers.append(value)
+        return {'__buffer__': len(buffers) - 1}
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        buffers.append(bytes(value))
+        return {'__buffer__': len(buffers) - 1}
+    elif isinstance(value, dict):
+        return {k: _pack_settings(v, buffers) for k, v in value.items()}
+    elif isinstance(value, (list, tuple)):
+        if _is_table_grid(value):
+            # Store text as a fixed width unicode array with a mask to tell None apart from empty strings
+            mask = np.array([[cell is None for cell in row] for row in value])
+            text = np.array([[cell or '' for cell in row] for row in value], dtype=str)
+            buffers.extend((text, mask))
+            return {'__grid__': [len(buffers) - 2, len(buffers) - 1]}
+
+        return [_pack_settings(v, buffers) for v in value]
+
+    return value
+
+
+def _unpack_settings(value, buffers):
+    if isinstance(value, dict):
+        if '__buffer__' in value:
+            return buffers[value['__buffer__']]
+        elif '__grid__' in value:
+            text, mask = (buffers[i].tolist() for i in value['__grid__'])
+            return [[None if empty else cell for cell, empty in zip(*row)] for row in zip(text, mask)]
+
+        return {k: _unpack_settings(v, buffers) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_unpack_settings(v, buffers) for v in value]
+
+    return value
+
+
+def encode_settings(data):
+    buffers = []
+    tree = _pack_settings(data, buffers)
+
+    # Lay out buffers back to back, each aligned so arrays can be viewed in place
+    headers = []
+    chunks = []
+    offset = 0
+    for buffer in buffers:
+        if isinstance(buffer, bytes):
+            header = {'dtype': 'bytes'}
+            raw = buffer
+        else:
+            array = np.ascontiguousarray(buffer, dtype=buffer.dtype.newbyteorder('<'))
+            header = {'dtype': array.dtype.str, 'shape': list(array.shape)}
+            raw = array.tobytes()
+
+        padding = -offset % SETTINGS_ALIGNMENT
+        chunks.append(b'\0' * padding)
+        offset += padding
+
+        header.update(offset=offset, nbytes=len(raw))
+        headers.append(header)
+        chunks.append(raw)
+        offset += len(raw)
+
+    metadata = json.dumps({'data': tree, 'buffers': headers}, cls=NpEncoder).encode('utf-8')
+
+    return b''.join([SETTINGS_HEADER.pack(SETTINGS_MAGIC, SETTINGS_VERSION, len(metadata)), metadata, *chunks])
+
+
+# Optional uncompressed block in front of a compressed settings file with a few precomputed values, readable without
+# touching the rest of the file: magic, version, JSON length and CRC32 of the JSON
+SUMMARY_MAGIC = b'T2SH'
+SUMMARY_VERSION = 1
+SUMMARY_HEADER = struct.Struct('<4sBII')
+
+
+def encode_summary(summary):
+    raw = json.dumps(summary, cls=NpEncoder).encode('utf-8')
+    return SUMMARY_HEADER.pack(SUMMARY_MAGIC, SUMMARY_VERSION, len(raw), zlib.crc32(raw)) + raw
+
+
+# Summary block at the start of a file's header bytes: (summary, total block length), summary None if there isn't
+# one. Raises ValueError if the block is there but damaged or incomplete
+def decode_summary(raw):
+    if raw[:len(SUMMARY_MAGIC)] != SUMMARY_MAGIC:
+        return None, 0
+
+    if len(raw) < SUMMARY_HEADER.size:
+        raise ValueError('Truncated summary header')
+
+    _, version, size, checksum = SUMMARY_HEADER.unpack_from(raw)
+    if version > SUMMARY_VERSION:
+        raise ValueError(f'Unsupported summary version {version}')
+
+    end = SUMMARY_HEADER.size + size
+    block = raw[SUMMARY_HEADER.size:end]
+    if len(block) != size or zlib.crc32(block) != checksum:
+        raise ValueError('Summary checksum mismatch')
+
+    return json.loads(block.decode('utf-8')), end
+
+
+def is_settings_container(raw):
+    return raw[:len(SETTINGS_MAGIC)] == SETTINGS_MAGIC
+
+
+def decode_settings(raw):
+    if not is_settings_container(raw):
+        raise ValueError('Not a settings container')
+
+    _, version, metadata_size = SETTINGS_HEADER.unpack_from(raw)
+    if version > SETTINGS_VERSION:
+        raise ValueError(f'Unsupported settings version {version}')
+
+    metadata_start = SETTINGS_HEADER.size
+    payload_start = metadata_start + metadata_size
+    metadata = json.loads(raw[metadata_start:payload_start].decode('utf-8'))
+
+    payload = memoryview(raw)[payload_start:]
+    buffers = []
+    for header in metadata['buffers']:
+        start = header['offset']
+        end = start + header['nbytes']
+        if header['dtype'] == 'bytes':
+            buffers.append(bytes(payload[start:end]))
+        else:
+            dtype = np.dtype(header['dtype'])
+            # Copy out of the file buffer so the arrays are writable and don't keep the whole payload alive
+            array = np.frombuffer(payload[start:end], dtype=dtype).reshape(header['shape']).copy()
+            buffers.append(array)
+
+    return _unpack_settings(metadata['data'], buffers)
+
+
+# Write to a temporary file next to path and rename it into place, so readers only ever see a complete file
+def atomic_write(path, data):
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Advisory lock held on a separate <path>.lock file, e.g. `with FileLock(path): ...`
+class FileLock:
+    def __init__(self, path, timeout=5.0, poll_interval=0.01):
+        self.path = Path(f'{path}.lock')
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.file = None
+
+    def _try_lock(self):
+        if system() == 'Windows':
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(self):
+        if system() == 'Windows':
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a+b')
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._try_lock()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.file.close()
+                    raise TimeoutError(f'Timed out waiting for lock on {self.path}')
+                time.sleep(self.poll_interval)
+
+    def __exit__(self, *args):
+        try:
+            self._unlock()
+        finally:
+            self.file.close()
+
+
 def get_class_from_string(name):
     components = name.split('.')
     module = __import__(components[0])
@@ -49,11 +272,12 @@ def resource_path(relative_path):
     return base_path / relative_path
 
 
-def find_modules(module_path):
+# Dotted names of a package and all its subpackages, looked up relative to root (the working directory by default)
+def find_modules(module_path, root=None):
     module_path = '/'.join(module_path.split('.'))
-    for package in iter_modules([module_path]):
+    for package in iter_modules([str(Path(root) / module_path) if root else module_path]):
         if package.ispkg:
-            yield from find_modules(f'{module_path}/{package.name}')
+            yield from find_modules(f'{module_path}/{package.name}', root)
 
     yield '.'.join(module_path.split('/'))
 
@@ -86,6 +310,130 @@ def clamp(n, lower, upper):
     return max(lower, min(n, upper))
 
 
+# Hierarchical timing wheel over integer ticks. Level n has `slots` buckets each covering slots**n ticks; timers far
+# in the future sit in a coarse level and are cascaded down as their bucket comes up. Scheduling and cancelling are
+# O(1), and next_due() tells the caller when to wake up next instead of ticking continuously
+class TimerWheel:
+    def __init__(self, now, slots=64, levels=4):
+        self.now = now
+        self.slots = slots
+        self.levels = levels
+        self.wheels = [[set() for _ in range(slots)] for _ in range(levels)]
+        self.entries = {}   # Key -> (due, level, slot)
+
+    def schedule(self, key, due):
+        self.cancel(key)
+
+        # Anything already due fires on the next advance
+        due = max(due, self.now)
+        delta = due - self.now
+
+        level = 0
+        while level < self.levels - 1 and delta >= self.slots ** (level + 1):
+            level += 1
+
+        slot = (due // self.slots ** level) % self.slots
+        self.wheels[level][slot].add(key)
+        self.entries[key] = (due, level, slot)
+
+    def cancel(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            _, level, slot = entry
+            self.wheels[level][slot].discard(key)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Move time forward to now, returning the (key, due) of every timer that expired on the way, in order
+    def advance(self, now):
+        expired = []
+        while self.now <= now and self.entries:
+            # Cascade coarser buckets whose span starts at this tick
+            for level in range(self.levels - 1, 0, -1):
+                span = self.slots ** level
+                if self.now % span == 0:
+                    bucket = self.wheels[level][(self.now // span) % self.slots]
+                    keys = list(bucket)
+                    bucket.clear()
+                    for key in keys:
+                        self.schedule(key, self.entries.pop(key)[0])
+
+            bucket = self.wheels[0][self.now % self.slots]
+            for key in sorted(bucket, key=lambda k: self.entries[k][0]):
+                if self.entries[key][0] <= self.now:
+                    expired.append((key, self.entries.pop(key)[0]))
+                    bucket.discard(key)
+
+            if self.now == now:
+                break
+            self.now += 1
+
+        self.now = max(self.now, now)
+
+        return expired
+
+    # Earliest tick at which advance() has work to do, None if nothing is scheduled
+    def next_due(self):
+        if not self.entries:
+            return None
+
+        candidates = []
+        for offset in range(self.slots):
+            if self.wheels[0][(self.now + offset) % self.slots]:
+                candidates.append(self.now + offset)
+                break
+
+        # For coarser levels, the tick their next non-empty bucket gets cascaded. The current block's bucket has
+        # already been cascaded, so anything in it is due a whole turn of the wheel later
+        for level in range(1, self.levels):
+            span = self.slots ** level
+            block = self.now // span
+            for offset in range(1, self.slots + 1):
+                if self.wheels[level][(block + offset) % self.slots]:
+                    candidates.append((block + offset) * span)
+                    break
+
+        return min(candidates)
+
+
+# Binary indexed tree over integer values: point updates and prefix sums in O(log n)
+class FenwickTree:
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        self.size = values.size
+        self.tree = np.zeros(self.size + 1, dtype=np.int64)
+        self.tree[1:] = values
+
+        # Build in O(n) by pushing each node into its parent
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    # Sum of values[0:index]
+    def prefix_sum(self, index):
+        total = 0
+        i = min(index, self.size)
+        while i > 0:
+            total += int(self.tree[i])
+            i -= i & -i
+
+        return total
+
+    def range_sum(self, start, end):
+        return self.prefix_sum(end) - self.prefix_sum(start)
+
+
 def get_reg_key(reg_path, name):
     value = None
     try:
@@ -4,13 +4,17 @@ import json
 # Third party imports
 import numpy as np
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import pyqtSignal, Qt, QTimer, QObject, QPoint
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer, QObject, QPoint, QItemSelection, QMimeData, QModelIndex, QByteArray, \
+    QDataStream, QIODevice
 from PyQt5.QtGui import QValidator, QIntValidator, QDoubleValidator, QTextCursor
 from si_prefix import si_parse
 from pathvalidate import is_valid_filename
 
 # Local imports
-from . import get_class_from_string, get_object_class_name
+from . import get_class_from_string, get_object_class_name, encode_settings, decode_settings, is_settings_container, \
+    atomic_write, encode_summary, decode_summary, SUMMARY_MAGIC, SUMMARY_HEADER
+
+GZIP_MAGIC = b'\x1f\x8b'
 
 
 def get_widget_value(widget):
@@ -294,6 +298,57 @@ def scan_sweep_table_checkbox(table):
     return starting_values, ending_values, step_size_values, num_steps_values
 
 
+# Whole table model as Qt's own item data stream (what drag and drop uses), encoded in one native call. Every item
+# role is kept, so text and check states round trip
+def get_table_snapshot(table):
+    model = table.model()
+    if not model.rowCount() or not model.columnCount():
+        return b''
+
+    indexes = QItemSelection(model.index(0, 0), model.index(model.rowCount() - 1, model.columnCount() - 1)).indexes()
+    mime_data = model.mimeData(indexes)
+
+    return bytes(mime_data.data(model.mimeTypes()[0]))
+
+
+# (row, column) of every cell in a snapshot. Qt's item data stream is each cell's row and column followed by its map of
+# roles to values; cells without an item are there with an empty map
+def snapshot_cells(snapshot):
+    data = QByteArray(snapshot)     # The stream reads from it, so it has to outlive the stream
+    stream = QDataStream(data, QIODevice.ReadOnly)
+    cells = []
+    while not stream.atEnd():
+        row, column = stream.readInt32(), stream.readInt32()
+        for _ in range(stream.readUInt32()):
+            stream.readInt32()
+            stream.readQVariant()
+        if stream.status() != QDataStream.Ok:
+            raise ValueError('Invalid table snapshot')
+        cells.append((row, column))
+
+    return cells
+
+
+# Inverse of get_table_snapshot, overwriting every cell the snapshot covers. Dropping only sets the roles a cell has
+# in the snapshot, so covered cells are emptied first and the ones that were empty when it was taken end up empty
+def set_table_snapshot(table, snapshot):
+    if not snapshot:
+        return
+
+    cells = snapshot_cells(snapshot)
+    if cells:
+        top = min(row for row, _ in cells)
+        left = min(column for _, column in cells)
+        for row, column in cells:
+            table.takeItem(row - top, column - left)
+
+    model = table.model()
+    mime_data = QMimeData()
+    mime_data.setData(model.mimeTypes()[0], snapshot)
+    if not model.dropMimeData(mime_data, Qt.CopyAction, 0, 0, QModelIndex()):
+        raise ValueError('Invalid table snapshot')
+
+
 def get_widget_info(widget):
     return {
         'class': get_object_class_name(widget),
@@ -302,14 +357,16 @@ def get_widget_info(widget):
     }
 
 
-def save_to_json_gz(data, path, file_name=''):
+# compress_level trades save time for file size (0 = store only, 9 = smallest). Arrays are stored as raw buffers.
+# A summary dict is written uncompressed in front, where read_summary can get at it without decompressing anything
+def save_to_json_gz(data, path, file_name='', compress_level=6, summary=None):
     if not file_name:
         file_name, _ = QtWidgets.QFileDialog.getSaveFileName(None, 'Save File', str(path), 'GZ files (*.gz)')
 
     # If user didn't cancel out of the dialog
     if file_name:
-        with gzip.open(path / file_name, 'wt', encoding='utf-8') as f:
-            json.dump(data, f)
+        header = encode_summary(summary) if summary is not None else b''
+        atomic_write(path / file_name, header + gzip.compress(encode_settings(data), compresslevel=compress_level))
 
 
 def load_from_json_gz(path, file_name=''):
@@ -320,8 +377,45 @@ def load_from_json_gz(path, file_name=''):
 
     # If user didn't cancel out of the dialog and the path exists
     if file_name and file_path.exists():
-        with gzip.open(file_path, 'rt', encoding='utf-8') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            compressed = f.read()
+
+        # Skip the summary block; a damaged one doesn't matter here since everything is in the compressed part. Its
+        # length can't be trusted then either, but the summary is ASCII JSON so the gzip magic marks where data starts.
+        # A header with a damaged magic reads as no summary at all, and then the data doesn't start the file
+        try:
+            _, start = decode_summary(compressed)
+        except ValueError:
+            start = None
+
+        if start is None or not compressed.startswith(GZIP_MAGIC, start):
+            start = compressed.find(GZIP_MAGIC, SUMMARY_HEADER.size)
+            if start < 0:
+                raise ValueError(f'{file_name} is damaged or truncated')
+
+        try:
+            raw = gzip.decompress(compressed[start:])
+        except EOFError:
+            raise ValueError(f'{file_name} is truncated') from None
+
+        # Files written before the settings container existed are plain gzipped JSON
+        if is_settings_container(raw):
+            return decode_settings(raw)
+
+        return json.loads(raw.decode('utf-8'))
+
+
+# Just the uncompressed summary of a file written by save_to_json_gz, None if it has none or it's damaged
+def read_summary(path, file_name):
+    try:
+        with open(path / file_name, 'rb') as f:
+            header = f.read(SUMMARY_HEADER.size)
+            if len(header) < SUMMARY_HEADER.size or header[:len(SUMMARY_MAGIC)] != SUMMARY_MAGIC:
+                return None
+
+            return decode_summary(header + f.read(SUMMARY_HEADER.unpack(header)[2]))[0]
+    except (OSError, ValueError):
+        return None
 
 
 # Icon options: QMessageBox.Critical, QMessageBox.Information, QMessageBox.Question, QMessageBox.Warning
@@ -0,0 +1,96 @@
+import datetime
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from common import FenwickTree
+from punch_model import local_durations, week_dates
+from week_engine import day_totals
+from week_history import DAYS_PER_WEEK, COLUMNS, WeekHistory, week_start_of
+from work_rules import CompiledRules
+
+LEDGER_BATCH_WEEKS = 52
+
+
+# Running overtime/flex balance over every stored day (worked minus required minutes).
+# Balances come from a cumulative sum built once (O(1) lookups); later edits are kept in a Fenwick tree of deltas so
+# changing a past day costs O(log n) and lookups stay O(log n) until the next rebuild
+class FlexLedger:
+    def __init__(self, first_day, worked, required):
+        self.first_day = first_day
+        self.rebuild(np.asarray(worked, dtype=np.int64) - np.asarray(required, dtype=np.int64))
+
+    # Worked minutes of every stored day, the weeks read LEDGER_BATCH_WEEKS at a time so only the per-day totals are
+    # kept, gaps between stored weeks being days without work
+    @classmethod
+    def from_history(cls, history, rules):
+        week_starts = history.week_starts()
+        if not week_starts:
+            return cls(None, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        first_day = week_starts[0]
+        num_days = (week_starts[-1] - first_day).days + DAYS_PER_WEEK
+        worked = np.zeros(num_days, dtype=np.int64)
+        for i in range(0, len(week_starts), LEDGER_BATCH_WEEKS):
+            batch = week_starts[i:i + LEDGER_BATCH_WEEKS]
+            days = np.stack([history.weeks[week_start] for week_start in batch]).reshape(-1, COLUMNS)
+            batch_worked, _ = day_totals(days, local_durations(week_dates(batch), days, rules.max_day_minutes))
+            batch_worked = rules.apply_breaks(batch_worked, days)
+
+            offsets = np.array([(week_start - first_day).days for week_start in batch])
+            worked[(offsets[:, None] + np.arange(DAYS_PER_WEEK)).ravel()] = batch_worked
+
+        return cls(first_day, worked, rules.daily_requirements(first_day, num_days))
+
+    def rebuild(self, values):
+        self.values = values
+        self.prefix = np.concatenate(([0], np.cumsum(values)))
+        self.edits = FenwickTree(np.zeros_like(values))
+        self.edited = False
+
+    # Grow the ledger by whole weeks so it covers date
+    def extend_to(self, date):
+        if self.first_day is None:
+            self.first_day = week_start_of(date)
+
+        if date < self.first_day:
+            padding = (self.first_day - week_start_of(date)).days
+            self.first_day = week_start_of(date)
+            self.rebuild(np.concatenate((np.zeros(padding, dtype=np.int64), self.values)))
+        elif (date - self.first_day).days >= self.values.size:
+            padding = (week_start_of(date) - self.first_day).days + DAYS_PER_WEEK - self.values.size
+            self.rebuild(np.concatenate((self.values, np.zeros(padding, dtype=np.int64))))
+
+    def set_day(self, date, worked, required):
+        self.extend_to(date)
+
+        index = (date - self.first_day).days
+        delta = int(worked) - int(required) - int(self.values[index])
+        if delta:
+            self.values[index] += delta
+            self.edits.add(index, delta)
+            self.edited = True
+
+    def _prefix(self, index):
+        index = int(np.clip(index, 0, self.values.size))
+        total = int(self.prefix[index])
+        if self.edited:
+            total += self.edits.prefix_sum(index)
+
+        return total
+
+    # Balance in minutes over [start, end), by default everything stored before today
+    def balance(self, start=None, end=None):
+        if self.first_day is None:
+            return 0
+
+        start = 0 if start is None else (start - self.first_day).days
+        end = (end or datetime.date.today()) - self.first_day
+
+        return self._prefix(end.days) - self._prefix(start)
+
+
+# Headless lookup straight from the stored weeks, e.g. for scripts
+def query_balance(directory, start=None, end=None):
+    return FlexLedger.from_history(WeekHistory(directory).load(), CompiledRules.load(directory)).balance(start, end)
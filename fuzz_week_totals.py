@@ -0,0 +1,350 @@
+import argparse
+import datetime
+import multiprocessing
+import os
+import random
+import time
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from leave_planner import plan_week, describe_plan
+from punch_model import local_durations, week_dates
+from week_engine import MINUTES_REQUIRED, MINUTES_PER_DAY, WORKDAYS, parse_minutes_array, day_totals, week_labels
+from work_calendar import WorkCalendar
+from work_rules import CompiledRules
+
+ROWS = 7
+COLUMNS = 4
+MAX_REPORTED_MISMATCHES = 10
+MAX_OVERNIGHT_MINUTES = CompiledRules({}).max_day_minutes
+
+
+############################################################################
+# Reference: the original MainWindow.update_time/get_minutes, minus the Qt table.
+# With overnight=True each punch is a local time on the row's date in the given week, moved to the next day when it's
+# earlier than the punch before it, and pairs count their real elapsed time, as the table now treats them. A pair
+# crossing midnight that's longer than the default rules' max_day_minutes is taken for a typo and counts nothing
+############################################################################
+def reference_text(cell):
+    # An empty table cell has no item, so .text() raised AttributeError
+    if cell is None:
+        raise AttributeError("'NoneType' object has no attribute 'text'")
+
+    return cell
+
+
+def reference_get_minutes(time):
+    t1 = datetime.datetime.strptime(time, '%H:%M')
+    t2 = datetime.datetime(1900, 1, 1)
+
+    return (t1 - t2).total_seconds() / 60.0
+
+
+# Minutes since the epoch of a punch on date, or a later day if the shift has crossed midnight. day is
+# [days after date, clock minutes of the punch before] and carries along the row
+def reference_local_minutes(time, date, day):
+    minutes = int(reference_get_minutes(reference_text(time)))
+    if minutes < day[1]:
+        day[0] += 1
+    day[1] = minutes
+
+    local = datetime.datetime.combine(date + datetime.timedelta(days=day[0]), datetime.time())
+    return (local + datetime.timedelta(minutes=minutes)).timestamp() / 60.0
+
+
+def reference_labels(grid, overnight=False, week_start=None):
+    worked_minutes = 0
+    unfinished_days = 0
+    for i in range(len(grid)):
+        try:
+            unfinished = True
+            day = [0, -1]
+
+            for j in range(len(grid[i])):
+                if j % 2 == 0:  # Even numbers
+                    if overnight:
+                        date = week_start + datetime.timedelta(days=i)
+                        punch_in = reference_local_minutes(grid[i][j], date, day)
+                        in_day = day[0]
+                        temp_worked_minutes = reference_local_minutes(grid[i][j+1], date, day) - punch_in
+                        if day[0] != in_day and temp_worked_minutes > MAX_OVERNIGHT_MINUTES:
+                            temp_worked_minutes = 0
+                    else:
+                        temp_worked_minutes = reference_get_minutes(reference_text(grid[i][j+1])) - \
+                                              reference_get_minutes(reference_text(grid[i][j]))
+                    if temp_worked_minutes > 0:
+                        worked_minutes += temp_worked_minutes
+                        unfinished = False
+
+        except:
+            if unfinished and i < 5:
+                unfinished_days += 1
+
+    remaining_minutes = MINUTES_REQUIRED - worked_minutes
+    hours = int(abs(remaining_minutes)/60)
+    minutes = int(abs(remaining_minutes) - 60 * hours)
+
+    # FLip sign only once if negative
+    if remaining_minutes < 0:
+        sign = '-'
+    else:
+        sign = ''
+
+    if minutes < 10:
+        minutes = f'0{minutes}'
+
+    try:
+        remaining_minutes_per_day = remaining_minutes/unfinished_days
+        hours_per_day = int(abs(remaining_minutes_per_day)/60)
+        minutes_per_day = int(abs(remaining_minutes_per_day) - 60 * hours_per_day)
+    except ZeroDivisionError:
+        remaining_minutes_per_day = 0
+        hours_per_day = 0
+        minutes_per_day = 0
+
+    if remaining_minutes_per_day < 0:
+        day_sign = '-'
+    else:
+        day_sign = ''
+
+    if minutes_per_day < 10:
+        minutes_per_day = f'0{minutes_per_day}'
+
+    return (f'Time left this week: {sign}{hours}:{minutes}',
+            f'Time left per remaining weekday: {day_sign}{hours_per_day}:{minutes_per_day}')
+
+
+############################################################################
+# Optimized: week_engine over a whole batch of weeks at once, with overnight=True through punch_model's local
+# durations for the weeks starting on week_starts, as the table computes them
+############################################################################
+def optimized_labels(grids, overnight=False, week_starts=None):
+    minutes = parse_minutes_array([[[cell or '' for cell in row] for row in grid] for grid in grids])
+    days = minutes.reshape(-1, COLUMNS)
+    durations = local_durations(week_dates(week_starts), days, MAX_OVERNIGHT_MINUTES) if overnight else None
+    worked, unfinished = day_totals(days, durations)
+
+    worked = worked.reshape(len(grids), ROWS).sum(axis=1)
+    unfinished_days = np.count_nonzero(unfinished.reshape(len(grids), ROWS)[:, :WORKDAYS], axis=1)
+
+    return [week_labels(w, u) for w, u in zip(worked.tolist(), unfinished_days.tolist())]
+
+
+############################################################################
+# Random weeks
+############################################################################
+MALFORMED_TIMES = ['', ' ', 'abc', '24:00', '9:60', '9-00', '09:00 ', ' 09:00', '9:000', '009:00', '9:', ':30',
+                   '+9:00', '-1:00', '9.30', '٩:٣٠', '12:5', '7:05pm']
+
+
+def random_time(rng):
+    hour = rng.randrange(24)
+    minute = rng.randrange(60)
+    style = rng.randrange(3)
+    if style == 0:
+        return f'{hour:02d}:{minute:02d}'
+    elif style == 1:
+        return f'{hour}:{minute:02d}'
+
+    return f'{hour}:{minute}'
+
+
+def random_day(rng):
+    kind = rng.random()
+    if kind < 0.15:
+        # Empty day
+        return [None] * COLUMNS
+    elif kind < 0.25:
+        # Overnight shift, the out time is on the next day
+        start = rng.randrange(18 * 60, 24 * 60)
+        end = (start + rng.randrange(4 * 60, 10 * 60)) % (24 * 60)
+        return [f'{start // 60:02d}:{start % 60:02d}', f'{end // 60:02d}:{end % 60:02d}', None, None]
+
+    day = [random_time(rng) for _ in range(COLUMNS)]
+    for j in range(COLUMNS):
+        roll = rng.random()
+        if roll < 0.1:
+            day[j] = None                               # Missing punch
+        elif roll < 0.15:
+            day[j] = rng.choice(MALFORMED_TIMES)
+    if rng.random() < 0.1:
+        day[0], day[1] = day[1], day[0]                 # Negative interval
+
+    return day
+
+
+def random_week(rng):
+    return [random_day(rng) for _ in range(ROWS)]
+
+
+# Monday of a random week over ten years, so some weeks have a DST change in the local timezone
+def random_week_start(rng):
+    return datetime.date(2020, 1, 6) + datetime.timedelta(days=7 * rng.randrange(52 * 10))
+
+
+# Greedily clear cells while the mismatch persists, leaving the smallest week that still shows it
+def minimize(grid, overnight=False, week_start=None):
+    grid = [list(row) for row in grid]
+    changed = True
+    while changed:
+        changed = False
+        for i in range(ROWS):
+            for j in range(COLUMNS):
+                if grid[i][j] is None:
+                    continue
+
+                candidate = [list(row) for row in grid]
+                candidate[i][j] = None
+                if reference_labels(candidate, overnight, week_start) != \
+                        optimized_labels([candidate], overnight, [week_start])[0]:
+                    grid = candidate
+                    changed = True
+
+    return grid
+
+
+def run_chunk(arguments):
+    seed, num_cases, overnight = arguments
+    rng = random.Random(seed)
+    grids = [random_week(rng) for _ in range(num_cases)]
+    week_starts = [random_week_start(rng) for _ in range(num_cases)]
+
+    start = time.perf_counter()
+    reference = [reference_labels(grid, overnight, week_start) for grid, week_start in zip(grids, week_starts)]
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    optimized = optimized_labels(grids, overnight, week_starts)
+    optimized_time = time.perf_counter() - start
+
+    mismatches = [(grid, week_start, expected, actual)
+                  for grid, week_start, expected, actual in zip(grids, week_starts, reference, optimized)
+                  if expected != actual]
+
+    return num_cases, reference_time, optimized_time, len(mismatches), mismatches[:MAX_REPORTED_MISMATCHES]
+
+
+############################################################################
+# Leave plans: plan_week has no reference, so check it doesn't raise and that today's leave times are consistent
+############################################################################
+PLAN_RULES = [
+    {},
+    {'breaks': [{'after_minutes': 360, 'break_minutes': 30}, {'after_minutes': 540, 'break_minutes': 45}]},
+]
+PLAN_WEEK_START = datetime.date(2024, 6, 3)
+
+
+def check_plan(grid, rules, today, now):
+    minutes = parse_minutes_array([[cell or '' for cell in row] for row in grid])
+    worked, _ = day_totals(minutes, local_durations(week_dates([PLAN_WEEK_START]), minutes, rules.max_day_minutes))
+    worked = rules.apply_breaks(worked, minutes)
+    required = rules.daily_requirements(PLAN_WEEK_START, ROWS)
+    working = WorkCalendar(rules).working_mask(PLAN_WEEK_START, ROWS)
+
+    plan = plan_week(minutes, worked, required, working, today, now, rules)
+    describe_plan(plan, PLAN_WEEK_START, today, worked)
+
+    leave, earliest = plan['leave_today'], plan['earliest_leave_today']
+    if leave is None and earliest is not None:
+        raise AssertionError(f'earliest leave {earliest} without a leave time')
+    if leave is not None and earliest is not None and earliest > leave:
+        raise AssertionError(f'earliest leave {earliest} after the planned {leave}')
+
+
+def run_plan_chunk(arguments):
+    seed, num_cases = arguments
+    rng = random.Random(seed)
+    rule_sets = [CompiledRules(rules) for rules in PLAN_RULES]
+
+    start = time.perf_counter()
+    failures = []
+    for _ in range(num_cases):
+        grid, rules, today, now = random_week(rng), rng.randrange(len(rule_sets)), rng.randrange(-1, ROWS + 1), \
+            rng.randrange(MINUTES_PER_DAY)
+        try:
+            check_plan(grid, rule_sets[rules], today, now)
+        except Exception as e:
+            failures.append((grid, rules, today, now, repr(e)))
+
+    return num_cases, time.perf_counter() - start, len(failures), failures[:MAX_REPORTED_MISMATCHES]
+
+
+def check_plans(args):
+    chunks = [(args.seed + i, min(args.chunk, args.cases - i * args.chunk))
+              for i in range((args.cases + args.chunk - 1) // args.chunk)]
+
+    total_cases = total_failures = 0
+    plan_time = 0.0
+    examples = []
+    with multiprocessing.Pool(args.workers) as pool:
+        for num_cases, chunk_time, num_failures, chunk_examples in pool.imap_unordered(run_plan_chunk, chunks):
+            total_cases += num_cases
+            plan_time += chunk_time
+            total_failures += num_failures
+            examples += chunk_examples[:MAX_REPORTED_MISMATCHES - len(examples)]
+
+    print(f'Plans: {total_cases}, failures: {total_failures}')
+    print(f'Planner: {total_cases / plan_time:,.0f} plans/s per core')
+
+    for grid, rules, today, now, error in examples:
+        print(f'\nRules {PLAN_RULES[rules]}, today row {today}, now {now}: {error}')
+        for row in grid:
+            print(f'    {row}')
+
+    return 1 if total_failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the optimized weekly totals against the original logic')
+    parser.add_argument('--cases', type=int, default=1_000_000, help='Number of random weeks')
+    parser.add_argument('--chunk', type=int, default=20_000, help='Weeks per worker task')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--overnight', action='store_true', help='Count an Out before its In as the next day')
+    parser.add_argument('--timezone', help='Local timezone for --overnight, e.g. Europe/Berlin to cover DST changes')
+    parser.add_argument('--plan', action='store_true', help='Check leave plans for random weeks instead of totals')
+    args = parser.parse_args()
+
+    # Workers inherit the environment, set it before the pool starts
+    if args.timezone:
+        os.environ['TZ'] = args.timezone
+        time.tzset()
+
+    if args.plan:
+        return check_plans(args)
+
+    chunks = [(args.seed + i, min(args.chunk, args.cases - i * args.chunk), args.overnight)
+              for i in range((args.cases + args.chunk - 1) // args.chunk)]
+
+    total_cases = total_mismatches = 0
+    reference_time = optimized_time = 0.0
+    examples = []
+    with multiprocessing.Pool(args.workers) as pool:
+        for result in pool.imap_unordered(run_chunk, chunks):
+            num_cases, chunk_reference_time, chunk_optimized_time, num_mismatches, chunk_examples = result
+            total_cases += num_cases
+            reference_time += chunk_reference_time
+            optimized_time += chunk_optimized_time
+            total_mismatches += num_mismatches
+            examples += chunk_examples[:MAX_REPORTED_MISMATCHES - len(examples)]
+
+    # Per-core throughput: time is summed over the workers
+    print(f'Cases: {total_cases}, mismatches: {total_mismatches}')
+    print(f'Reference: {total_cases / reference_time:,.0f} cases/s per core')
+    print(f'Optimized: {total_cases / optimized_time:,.0f} cases/s per core')
+
+    for grid, week_start, _, _ in examples:
+        grid = minimize(grid, args.overnight, week_start)
+        print(f'\nMinimal reproducer (week of {week_start}):' if args.overnight else '\nMinimal reproducer:')
+        for row in grid:
+            print(f'    {row}')
+        print(f'  reference: {reference_labels(grid, args.overnight, week_start)}')
+        print(f'  optimized: {optimized_labels([grid], args.overnight, [week_start])[0]}')
+
+    return 1 if total_mismatches else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
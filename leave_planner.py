@@ -0,0 +1,182 @@
+import datetime
+import time
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from week_engine import NO_TIME, format_duration
+
+FRAME_BUDGET_MS = 16
+PLAN_DEFER_MS = 250     # How long re-planning waits after a plan went over FRAME_BUDGET_MS
+
+
+# Minutes that count as work out of `gross` minutes at work, once whatever is missing from the minimum break (beyond
+# `recorded` minutes already taken between pairs) is deducted. Same rule as CompiledRules.apply_breaks
+def net_minutes(gross, rules, recorded=0):
+    gross = np.asarray(gross, dtype=np.int64)
+    if not rules.break_thresholds.size:
+        return gross
+
+    rule = np.searchsorted(rules.break_thresholds, gross, side='left') - 1
+    required_break = np.where(rule >= 0, rules.break_minutes[np.maximum(rule, 0)], 0)
+
+    return np.maximum(gross - np.maximum(required_break - recorded, 0), 0)
+
+
+# Inverse of net_minutes: the least time at work that yields `net` minutes of work. A longer day can cross the next
+# break threshold, so the break is re-evaluated until it settles (at most once per rule)
+def gross_minutes(net, rules, recorded=0):
+    net = np.asarray(net, dtype=np.int64)
+    if not rules.break_thresholds.size:
+        return net
+
+    gross = net.copy()
+    for _ in range(rules.break_thresholds.size + 1):
+        rule = np.searchsorted(rules.break_thresholds, gross, side='left') - 1
+        required_break = np.where(rule >= 0, rules.break_minutes[np.maximum(rule, 0)], 0)
+        gross = net + np.maximum(required_break - recorded, 0)
+
+    return gross
+
+
+# Spread `total` minutes over days with the given capacities keeping the longest day as short as possible: visit days
+# from the smallest capacity up, each taking either its capacity or an even share of what's left
+def water_fill(total, capacities):
+    capacities = np.asarray(capacities, dtype=np.int64)
+    allocation = np.zeros(capacities.size, dtype=np.int64)
+    order = np.argsort(capacities, kind='stable')
+
+    left = max(int(total), 0)
+    for i, day in enumerate(order.tolist()):
+        days_left = capacities.size - i
+        share = -(-left // days_left)  # Round up so the minutes add up, the first days taking the extra minute
+        allocation[day] = min(int(capacities[day]), share)
+        left -= allocation[day]
+
+    return allocation
+
+
+# Plan the rest of the week from today's row on.
+#   minutes: the week's clock minutes, worked: minutes worked per day after breaks, required: required minutes per day,
+#   working: days work can be planned on, today: today's row (past days are fixed), now: current clock minutes
+# Returns planned worked minutes per day, the clock time today's plan ends, the earliest clock time today's work can
+# end with the rest of the week still fitting, and the minutes that don't fit anywhere. Away from work with today's
+# minimum already done, the earliest leave time is None while the plan may still suggest coming back
+def plan_week(minutes, worked, required, working, today, now, rules):
+    num_days = minutes.shape[0]
+    worked = np.asarray(worked, dtype=np.int64)
+    planned = worked.copy()
+    day_capacity = min(rules.max_day_minutes, int(net_minutes(max(rules.latest_end - rules.earliest_start, 0), rules)))
+
+    # Days after today that haven't been worked yet
+    future = np.zeros(num_days, dtype=bool)
+    future[max(today + 1, 0):] = True
+    future &= np.asarray(working, dtype=bool) & (worked == 0)
+    capacities = np.where(future, day_capacity, 0)
+
+    result = {'planned': planned, 'leave_today': None, 'earliest_leave_today': None, 'shortfall': 0,
+              'punched_in': False}
+    remaining = int(np.sum(required)) - int(worked.sum())
+
+    if not 0 <= today < num_days:
+        planned[future] = water_fill(remaining, capacities[future])
+        result['shortfall'] = max(remaining - int(planned[future].sum()), 0)
+        return result
+
+    # Today: time already spent in closed pairs, the break recorded between them and where more work would start
+    row = minutes[today]
+    ins, outs = row[0::2], row[1::2]
+    closed = (ins != NO_TIME) & (outs != NO_TIME)
+    closed_gross = int(np.maximum(np.where(closed, outs - ins, 0), 0).sum())
+    recorded = int(max(row[2] - row[1], 0)) if row[1] != NO_TIME and row[2] != NO_TIME else 0
+
+    filled = np.flatnonzero(row != NO_TIME)
+    punched_in = filled.size and filled[-1] % 2 == 0
+    if punched_in:
+        start = int(row[filled[-1]])
+    elif filled.size == row.size:
+        start = None    # No cells left to punch in again
+    else:
+        start = max(now, rules.earliest_start)
+
+        # Coming back after the first pair, the time away is the break
+        if filled.size == 2:
+            recorded = max(start - int(row[1]), 0)
+
+    worked_today = int(worked[today])
+    if start is None or start >= rules.latest_end:
+        today_capacity = worked_today
+    else:
+        today_capacity = min(max(rules.max_day_minutes, worked_today),
+                             int(net_minutes(closed_gross + rules.latest_end - start, rules, recorded)))
+
+    # Remaining target for today and the days after it
+    remaining += worked_today
+    future_capacity = int(capacities.sum())
+    earliest_today = min(max(remaining - future_capacity, worked_today), today_capacity)
+
+    # Balanced plan, with today never planned below what's already done
+    days = np.flatnonzero(future | (np.arange(num_days) == today))
+    allocation = water_fill(remaining, np.where(days == today, today_capacity, capacities[days]))
+    if allocation[days == today][0] < earliest_today:
+        allocation[days == today] = earliest_today
+        allocation[days != today] = water_fill(remaining - earliest_today, capacities[days[days != today]])
+    planned[days] = allocation
+    result['shortfall'] = max(remaining - int(allocation.sum()), 0)
+
+    def leave_at(target):
+        if start is None or target <= worked_today and not punched_in:
+            return None
+        return start + max(int(gross_minutes(target, rules, recorded)) - closed_gross, 0)
+
+    result['punched_in'] = bool(punched_in)
+    result['leave_today'] = leave_at(int(planned[today]))
+    result['earliest_leave_today'] = leave_at(earliest_today)
+
+    return result
+
+
+# plan_week cached on everything it depends on, so redraws and repeated edits that don't change the table (or the
+# minute) reuse the last plan; the time each plan took is kept to check it stays within a frame
+class LeavePlanner:
+    def __init__(self, rules):
+        self.rules = rules
+        self.key = None
+        self.plan = None
+        self.elapsed_ms = 0.0
+
+    def update(self, minutes, worked, required, working, today, now):
+        key = (minutes.tobytes(), worked.tobytes(), required.tobytes(), np.asarray(working).tobytes(), today, now)
+        if key != self.key:
+            start = time.perf_counter()
+            self.plan = plan_week(minutes, worked, required, working, today, now, self.rules)
+            self.elapsed_ms = (time.perf_counter() - start) * 1000
+            self.key = key
+
+        return self.plan
+
+
+# One line describing a plan for the label under the table, e.g.
+#   Leave today at 16:24 (earliest 15:10); then Thu 8:24, Fri 8:24
+def describe_plan(plan, week_start, today, worked):
+    parts = []
+    if plan['leave_today'] is not None:
+        leave_today = format_duration(plan['leave_today'])
+        text = ('Leave today at ' if plan['punched_in'] else 'Punching in now, leave at ') + leave_today
+
+        earliest = plan['earliest_leave_today']
+        if earliest is None:
+            text += ' (optional)'
+        elif earliest != plan['leave_today']:
+            text += f' (earliest {format_duration(earliest)})'
+        parts.append(text)
+
+    days = [row for row in range(max(today + 1, 0), len(plan['planned'])) if plan['planned'][row] and not worked[row]]
+    if days:
+        parts.append('then ' + ', '.join(f'{week_start + datetime.timedelta(days=row):%a} '
+                                         f'{format_duration(int(plan["planned"][row]))}' for row in days))
+    if plan['shortfall']:
+        parts.append(f'{format_duration(plan["shortfall"])} won\'t fit this week')
+
+    return '; '.join(parts) if parts else 'Nothing left to plan this week'
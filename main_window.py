@@ -1,13 +1,24 @@
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QMainWindow
+from PyQt5.QtCore import Qt, QEvent, QTimer
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QTableWidgetItem, QTabBar
 import datetime
+import time
+import zlib
+import numpy as np
 
+from common.qt import set_table_snapshot, display_message
+from leave_planner import FRAME_BUDGET_MS, PLAN_DEFER_MS, LeavePlanner, describe_plan, gross_minutes
 from main_window_init import Ui_TimeToWork
+from punch_model import NO_PUNCH, PunchWeek, local_durations, week_dates
+from reminders import LEAVE, BREAK, CLOCK_OUT, BREAK_AFTER_MINUTES, FORGOT_CLOCK_OUT_MINUTES, ReminderScheduler
+from table_paste import split_block, block_dates, parse_block, fill_block, format_block
+from undo_stack import CellUndoStack
+from week_engine import NO_TIME, parse_minutes, format_duration, day_totals, week_labels
+from week_history import week_start_of
+from work_calendar import WorkCalendar
+from work_rules import CompiledRules
 
 
 class MainWindow(QMainWindow):
-    MINUTES_REQUIRED = 2520
-
     def __init__(self):
 
         super().__init__()
@@ -17,64 +28,472 @@ class MainWindow(QMainWindow):
         self.ui.setupUi(self)
         self.setAttribute(Qt.WA_DeleteOnClose, True)
 
-        self.ui.time_entry_table.itemChanged.connect(self.update_time)
+        # Parsed copy of the table in minutes, plus per day results so an edit only recomputes its own row
+        table = self.ui.time_entry_table
+        self.minutes = np.full((table.rowCount(), table.columnCount()), NO_TIME, dtype=np.int32)
+        self.worked_minutes, self.unfinished = day_totals(self.minutes)
+
+        # When each cell was last edited (epoch milliseconds), used to merge with other writers of the same week
+        self.modified = np.zeros(self.minutes.shape, dtype=np.int64)
+
+        self.undo_stack = CellUndoStack()
+
+        # Monday of the week shown in the table, the rules giving each day's required minutes, the calendar of working
+        # days and the flex ledger the table feeds (set up by WeeklyTimeTracker)
+        self.week_start = week_start_of(datetime.date.today())
+        self.rules = CompiledRules({})
+        self.calendar = WorkCalendar(self.rules)
+        self.requirements = self.rules.daily_requirements(self.week_start, table.rowCount())
+        self.working_days = self.calendar.working_mask(self.week_start, table.rowCount())
+        self.ledger = None
+
+        # The table's punches as absolute times, so shifts across midnight or DST changes get their real length
+        self.punches = PunchWeek(self.week_start, self.minutes)
+
+        # Plan for the rest of the week, recomputed once per event loop turn however many cells an edit touched
+        self.planner = LeavePlanner(self.rules)
+        self.plan_timer = QTimer(self)
+        self.plan_timer.setSingleShot(True)
+        self.plan_timer.timeout.connect(self.update_plan)
+
+        # Leave/break/clock out reminders for today, rescheduled whenever today's row changes
+        self.reminders = ReminderScheduler(self)
+
+        # Weeks open in the workspace (set up by WeeklyTimeTracker), one tab each above the table
+        self.workspace = None
+        self.week_tabs = QTabBar(self)
+        self.week_tabs.setTabsClosable(True)
+        self.week_tabs.setExpanding(False)
+        self.ui.verticalLayout.insertWidget(0, self.week_tabs)
+        self.week_tabs.currentChanged.connect(self.select_week_tab)
+        self.week_tabs.tabCloseRequested.connect(self.close_week_tab)
+
+        self.ui.time_entry_table.itemChanged.connect(self.update_cell)
+        self.ui.actionUndo.triggered.connect(self.undo)
+        self.ui.actionRedo.triggered.connect(self.redo)
+        self.ui.actionCopy.triggered.connect(self.copy_cells)
+        self.ui.actionPaste.triggered.connect(self.paste_cells)
+        self.ui.actionFillDown.triggered.connect(lambda: self.fill_cells(axis=0))
+        self.ui.actionFillRight.triggered.connect(lambda: self.fill_cells(axis=1))
+        week = datetime.timedelta(days=7)
+        self.ui.actionPreviousWeek.triggered.connect(lambda: self.show_week(self.week_start - week))
+        self.ui.actionNextWeek.triggered.connect(lambda: self.show_week(self.week_start + week))
+        self.ui.actionThisWeek.triggered.connect(lambda: self.show_week(week_start_of(datetime.date.today())))
+
+    def update_cell(self, item):
+        row, column = item.row(), item.column()
+        minutes = parse_minutes(item.text())
+
+        old_minutes = self.minutes[row, column]
+        if minutes != old_minutes:
+            self.undo_stack.push(row, column, old_minutes, minutes)
+            self.update_undo_actions()
+            self.modified[row, column] = int(time.time() * 1000)
+
+        self.minutes[row, column] = minutes
+        self.update_days([row])
 
     def update_time(self):
-        worked_minutes = 0
-        unfinished_days = 0
-        for i in range(self.ui.time_entry_table.rowCount()):
-            try:
-                unfinished = True
-
-                for j in range(self.ui.time_entry_table.columnCount()):
-                    # print(j, self.ui.time_entry_table.item(i, j).text())
-                    if j%2 == 0:  # Even numbers
-                        temp_worked_minutes = self.get_minutes(self.ui.time_entry_table.item(i, j+1).text()) - self.get_minutes(self.ui.time_entry_table.item(i, j).text())
-                        if temp_worked_minutes > 0:
-                            worked_minutes += temp_worked_minutes
-                            unfinished = False
-
-            except:
-                print(f' i={i} ')
-                if unfinished and i < 5:
-                    unfinished_days += 1
-                print(f' unfinished_days={unfinished_days}')
-
-        remaining_minutes = self.MINUTES_REQUIRED - worked_minutes
-        hours = int(abs(remaining_minutes)/60)
-        minutes = int(abs(remaining_minutes) - 60 * hours)
-
-        # FLip sign only once if negative
-        if remaining_minutes < 0:
-            sign = '-'
+        table = self.ui.time_entry_table
+        for i in range(table.rowCount()):
+            for j in range(table.columnCount()):
+                item = table.item(i, j)
+                self.minutes[i, j] = parse_minutes(item.text()) if item else NO_TIME
+
+        self.update_days(range(table.rowCount()))
+
+    # Restore the table from common.qt.get_table_snapshot bytes in one go: a single recompute, and one undo step
+    # covering every cell that changed
+    def restore_table(self, snapshot):
+        table = self.ui.time_entry_table
+        table.blockSignals(True)
+        try:
+            set_table_snapshot(table, snapshot)
+        finally:
+            table.blockSignals(False)
+
+        old_minutes = self.minutes.copy()
+        self.update_time()
+
+        rows, columns = np.nonzero(self.minutes != old_minutes)
+        with self.undo_stack.group():
+            for row, column in zip(rows.tolist(), columns.tolist()):
+                self.undo_stack.push(row, column, old_minutes[row, column], self.minutes[row, column])
+        self.modified[rows, columns] = int(time.time() * 1000)
+        self.update_undo_actions()
+
+    def update_days(self, rows):
+        rows = np.asarray(rows, dtype=int)
+        self.punches.update_rows(rows)
+        durations = self.punches.durations(rows, self.rules.max_day_minutes)
+        worked, self.unfinished[rows] = day_totals(self.minutes[rows], durations)
+        self.worked_minutes[rows] = self.rules.apply_breaks(worked, self.minutes[rows])
+
+        if self.ledger:
+            for row in rows.tolist():
+                self.ledger.set_day(self.week_start + datetime.timedelta(days=row), self.worked_minutes[row],
+                                    self.requirements[row])
+
+        # Today's row can only change while its week is shown, so other weeks leave the reminders alone
+        today = (datetime.date.today() - self.week_start).days
+        if today in rows:
+            self.update_reminders(today)
+
+        self.update_labels()
+
+    # Reminders only depend on today's row, so other edits leave them alone
+    def update_reminders(self, row):
+        punches = self.punches.epoch[row]
+        filled = np.flatnonzero(punches != NO_PUNCH)
+
+        # Nothing to remind about unless punched in right now
+        if not filled.size or filled[-1] % 2:
+            for key in (LEAVE, BREAK, CLOCK_OUT):
+                self.reminders.cancel(key)
+            return
+
+        punched_in = int(punches[filled[-1]])
+        required = int(self.requirements[row])
+
+        # Time at work the requirement takes once automatic breaks are deducted, less what closed pairs already cover
+        if int(self.worked_minutes[row]) < required:
+            closed_gross = int(np.maximum(self.punches.durations([row], self.rules.max_day_minutes), 0).sum())
+            recorded = max(int(punches[2]) - int(punches[1]), 0) if filled[-1] == 2 else 0
+            left = max(int(gross_minutes(required, self.rules, recorded)) - closed_gross, 0)
+            self.reminders.schedule(LEAVE, punched_in + left, 'Time to go',
+                                    f'You have worked your {format_duration(required)} today, '
+                                    f'you can leave now.')
+        else:
+            self.reminders.cancel(LEAVE)
+
+        # Only while no break has been taken yet today
+        break_after = int(self.rules.break_thresholds[0]) if self.rules.break_thresholds.size else BREAK_AFTER_MINUTES
+        if filled[-1] == 0:
+            self.reminders.schedule(BREAK, punched_in + break_after, 'Take a break',
+                                    f'You have worked {format_duration(break_after)}, take your mandatory break.')
         else:
-            sign = ''
+            self.reminders.cancel(BREAK)
+
+        # The reminder can come after midnight, so it punches out on the day it was set for
+        date = self.week_start + datetime.timedelta(days=row)
+        self.reminders.schedule(CLOCK_OUT, punched_in + FORGOT_CLOCK_OUT_MINUTES, 'Still punched in',
+                                f'You punched in {format_duration(FORGOT_CLOCK_OUT_MINUTES)} ago, did you forget to '
+                                f'punch out?', accepted=lambda: self.punch(punch_out=True, date=date))
+
+    def update_labels(self):
+        self.show_summary(self.get_summary())
+        self.update_flex_balance()
+        self.schedule_plan()
+
+    # Re-plan on the next event loop turn, unless the last plan took longer than a frame: then wait a little and plan
+    # once for however many edits come in meanwhile, so slow plans don't hold up typing
+    def schedule_plan(self):
+        if self.planner.elapsed_ms <= FRAME_BUDGET_MS:
+            self.plan_timer.start(0)
+        elif not self.plan_timer.isActive():
+            self.plan_timer.start(PLAN_DEFER_MS)
+
+    def update_plan(self):
+        now = datetime.datetime.now()
+        today = (now.date() - self.week_start).days
+        plan = self.planner.update(self.minutes, self.worked_minutes, self.requirements, self.working_days, today,
+                                   now.hour * 60 + now.minute)
+
+        self.ui.leave_plan_label.setText(describe_plan(plan, self.week_start, today, self.worked_minutes))
+
+    # The plan depends on the time when today hasn't been started yet, so refresh it when the window comes back
+    def changeEvent(self, event):
+        if event.type() == QEvent.ActivationChange and self.isActiveWindow():
+            self.schedule_plan()
+
+        super().changeEvent(event)
+
+    # Totals behind the labels for the week shown, plus a checksum of its cells. Save files carry this uncompressed
+    # so the labels can be shown before the table is loaded
+    def get_summary(self):
+        # Only working days (not weekends, holidays or days off) can be unfinished
+        unfinished_days = int(np.count_nonzero(self.unfinished & self.working_days))
+        worked_minutes = int(self.worked_minutes.sum())
+        required_minutes = int(self.requirements.sum())
+
+        return {
+            'week_start': self.week_start.isoformat(),
+            'worked_minutes': worked_minutes,
+            'required_minutes': required_minutes,
+            'remaining_minutes': required_minutes - worked_minutes,
+            'unfinished_days': unfinished_days,
+            'remaining_per_day': (required_minutes - worked_minutes) / unfinished_days if unfinished_days else 0,
+            'checksum': zlib.crc32(self.minutes.astype('<i4').tobytes()),
+        }
+
+    def show_summary(self, summary):
+        time_left, time_left_per_day = week_labels(summary['worked_minutes'], summary['unfinished_days'],
+                                                   summary['required_minutes'])
+
+        self.ui.time_left_label.setText(time_left)
+        self.ui.time_left_per_day_label.setText(time_left_per_day)
+
+    def set_rules(self, rules):
+        self.rules = rules
+        self.planner = LeavePlanner(rules)
+        self.calendar = WorkCalendar(rules)
+        self.set_week_start(self.week_start)
+
+    def set_week_start(self, week_start):
+        self.week_start = week_start
+        self.requirements = self.rules.daily_requirements(week_start, self.minutes.shape[0])
+        self.working_days = self.calendar.working_mask(week_start, self.minutes.shape[0])
+        self.punches = PunchWeek(week_start, self.minutes)
+        self.update_days(range(self.minutes.shape[0]))
+
+    # The table's arrays become the workspace's model for the week shown
+    def set_workspace(self, workspace):
+        self.workspace = workspace
+        workspace.open(self.week_start, self.minutes, self.modified, self.undo_stack)
+        self.update_week_tabs()
+
+    # Switch the table to another week, swapping in its model rather than copying cells
+    def show_week(self, week_start):
+        if not self.workspace:
+            self.set_week_start(week_start)
+            return
 
-        if minutes < 10:
-            minutes = f'0{minutes}'
+        if week_start == self.week_start:
+            return
 
+        # A damaged week file leaves the table on the week it was showing
         try:
-            remaining_minutes_per_day = remaining_minutes/unfinished_days
-            hours_per_day = int(abs(remaining_minutes_per_day)/60)
-            minutes_per_day = int(abs(remaining_minutes_per_day) - 60 * hours_per_day)
-        except ZeroDivisionError:
-            remaining_minutes_per_day = 0
-            hours_per_day = 0
-            minutes_per_day = 0
-
-        if remaining_minutes_per_day < 0:
-            day_sign = '-'
+            model = self.workspace.open(week_start)
+        except (OSError, ValueError, KeyError) as e:
+            display_message(QMessageBox.Warning, 'Open week', f'Could not open the week of {week_start:%d %b %Y}: {e}')
+            self.update_week_tabs()
+            return
+
+        self.minutes = model.minutes
+        self.modified = model.modified
+        self.undo_stack = model.undo_stack
+        self.set_week_start(week_start)
+
+        table = self.ui.time_entry_table
+        rows, columns = np.indices((table.rowCount(), table.columnCount()))
+        self.write_cells(rows.ravel(), columns.ravel())
+        self.update_undo_actions()
+        self.update_week_tabs()
+
+    def update_week_tabs(self):
+        self.week_tabs.blockSignals(True)
+        try:
+            while self.week_tabs.count():
+                self.week_tabs.removeTab(0)
+
+            for week_start in self.workspace.week_starts():
+                index = self.week_tabs.addTab(f'Week {week_start.isocalendar()[1]}, {week_start:%d %b %Y}')
+                self.week_tabs.setTabData(index, week_start.toordinal())
+                if week_start == self.week_start:
+                    self.week_tabs.setCurrentIndex(index)
+        finally:
+            self.week_tabs.blockSignals(False)
+
+    def select_week_tab(self, index):
+        if index >= 0:
+            self.show_week(datetime.date.fromordinal(self.week_tabs.tabData(index)))
+
+    def close_week_tab(self, index):
+        week_start = datetime.date.fromordinal(self.week_tabs.tabData(index))
+
+        # The week shown stays open, move to a neighbouring tab first
+        if week_start == self.week_start:
+            if self.week_tabs.count() < 2:
+                return
+            self.select_week_tab(index - 1 if index else 1)
+            if week_start == self.week_start:
+                return
+
+        try:
+            self.workspace.close(week_start)
+        except (OSError, ValueError, KeyError) as e:
+            display_message(QMessageBox.Warning, 'Close week', f'Could not save the week of {week_start:%d %b %Y}, '
+                                                               f'it stays open: {e}')
+        self.update_week_tabs()
+
+    def set_ledger(self, ledger):
+        self.ledger = ledger
+
+        # Make sure the ledger reflects the table rather than what was last stored for this week
+        self.update_days(range(self.minutes.shape[0]))
+
+    def update_flex_balance(self):
+        if self.ledger:
+            self.ui.flex_balance_label.setText(f'Flex balance (before today): {format_duration(self.ledger.balance())}')
+
+    # Fill the next In/Out cell of a day's row (today's unless given) with the current time
+    def punch(self, punch_out=False, date=None):
+        table = self.ui.time_entry_table
+        date = date or datetime.date.today()
+        row = (date - self.week_start).days
+        if not 0 <= row < table.rowCount() and self.workspace:
+            self.show_week(week_start_of(date))
+            row = (date - self.week_start).days
+        if not 0 <= row < table.rowCount():
+            raise ValueError('The table is showing a different week')
+
+        filled = np.flatnonzero(self.minutes[row] != NO_TIME)
+        column = filled[-1] + 1 if filled.size else 0
+        if column >= table.columnCount() or column % 2 != punch_out:
+            day = 'today' if date == datetime.date.today() else f'on {date:%a %d %b}'
+            raise ValueError(f'Already punched {"out" if punch_out else "in"} {day}')
+
+        text = datetime.datetime.now().strftime('%H:%M')
+        item = table.item(row, column)
+        if item:
+            item.setText(text)
+        else:
+            table.setItem(row, column, QTableWidgetItem(text))
+
+        return text
+
+    # Bounding (top, left, bottom, right) of the selected cells, or the current cell
+    def selected_block(self):
+        table = self.ui.time_entry_table
+        ranges = table.selectedRanges()
+        if not ranges:
+            row, column = max(table.currentRow(), 0), max(table.currentColumn(), 0)
+            return row, column, row, column
+
+        return (min(r.topRow() for r in ranges), min(r.leftColumn() for r in ranges),
+                max(r.bottomRow() for r in ranges), max(r.rightColumn() for r in ranges))
+
+    def copy_cells(self):
+        top, left, bottom, right = self.selected_block()
+        texts = [[self.punches.display(row, column) for column in range(left, right + 1)]
+                 for row in range(top, bottom + 1)]
+        QApplication.clipboard().setText(format_block(texts))
+
+    # Paste a TSV/CSV block at the current cell. Blocks whose rows start with a YYYY-MM-DD date go to those days
+    # instead, and rows past the end of the table carry on into the following weeks. Every cell is checked before
+    # anything changes, and each week is updated in one go
+    def paste_cells(self):
+        cells = split_block(QApplication.clipboard().text())
+        if not cells.size:
+            return
+
+        table = self.ui.time_entry_table
+        top, left, _, _ = self.selected_block()
+        dates = block_dates(cells)
+        if dates is None:
+            days = (np.datetime64(self.week_start, 'D') + top + np.arange(cells.shape[0])).astype(np.int64)
         else:
-            day_sign = ''
+            days = dates.astype(np.int64)
+            cells = cells[:, 1:]
+            left = 0
+
+        cells = cells[:, :table.columnCount() - left]
+        minutes, invalid = parse_block(cells)
+        if invalid.size:
+            row, column = invalid[0]
+            display_message(QMessageBox.Warning, 'Paste', f'{len(invalid)} cell(s) are not times, e.g. '
+                                                          f'"{cells[row, column]}" on line {row + 1}')
+            return
+
+        # Split the block by week, relative to Monday of this table's week
+        day_numbers = days - np.datetime64(self.week_start, 'D').astype(np.int64)
+        weeks = day_numbers // table.rowCount()
+        rows = np.repeat(day_numbers % table.rowCount(), cells.shape[1])
+        columns = np.tile(left + np.arange(cells.shape[1]), cells.shape[0])
+        weeks = np.repeat(weeks, cells.shape[1])
+        minutes = minutes.ravel()
+
+        for week in np.unique(weeks).tolist():
+            in_week = weeks == week
+            if week == 0:
+                self.set_cells(rows[in_week], columns[in_week], minutes[in_week])
+            elif self.workspace:
+                self.set_week_cells(self.week_start + datetime.timedelta(days=7 * week), rows[in_week],
+                                    columns[in_week], minutes[in_week])
+
+    # Spreadsheet style fill of the selection from its first row (axis 0) or column (axis 1)
+    def fill_cells(self, axis=0):
+        top, left, bottom, right = self.selected_block()
+        minutes = fill_block(self.minutes[top:bottom + 1, left:right + 1], axis)
+        rows, columns = np.indices(minutes.shape)
+        self.set_cells(rows.ravel() + top, columns.ravel() + left, minutes.ravel())
+
+    # Set cells of the table's week as one undo step, with a single recompute and repaint
+    def set_cells(self, rows, columns, minutes):
+        changed = self.minutes[rows, columns] != minutes
+        rows, columns, minutes = rows[changed], columns[changed], minutes[changed]
+        if not rows.size:
+            return
+
+        with self.undo_stack.group():
+            for row, column, value in zip(rows.tolist(), columns.tolist(), minutes.tolist()):
+                self.undo_stack.push(row, column, self.minutes[row, column], value)
+
+        self.apply_cells(rows, columns, minutes)
+
+    # Set cells of another week through the workspace and bring the flex ledger up to date with it
+    def set_week_cells(self, week_start, rows, columns, minutes):
+        try:
+            minutes = self.workspace.update_cells(week_start, rows, columns, minutes, int(time.time() * 1000))
+        except (OSError, ValueError, KeyError) as e:
+            display_message(QMessageBox.Warning, 'Paste', f'Could not update the week of {week_start:%d %b %Y}: {e}')
+            return
 
-        if minutes_per_day < 10:
-            minutes_per_day = f'0{minutes_per_day}'
+        if not self.ledger:
+            return
 
-        self.ui.time_left_label.setText(f'Time left this week: {sign}{hours}:{minutes}')
-        self.ui.time_left_per_day_label.setText(f'Time left per remaining weekday: {day_sign}{hours_per_day}:{minutes_per_day}')
+        dates = week_dates([week_start], minutes.shape[0])
+        worked, _ = day_totals(minutes, local_durations(dates, minutes, self.rules.max_day_minutes))
+        worked = self.rules.apply_breaks(worked, minutes)
+        requirements = self.rules.daily_requirements(week_start, minutes.shape[0])
+        for date, day_worked, required in zip(dates, worked.tolist(), requirements.tolist()):
+            self.ledger.set_day(date, day_worked, required)
+
+        self.update_flex_balance()
+
+    def undo(self):
+        self.apply_cells(*self.undo_stack.undo())
+
+    def redo(self):
+        self.apply_cells(*self.undo_stack.redo())
+
+    # Take cells another writer changed more recently than this table (see WeekHistory.save_week)
+    def merge_cells(self, minutes, modified):
+        rows, columns = np.nonzero((minutes != self.minutes) & (modified > self.modified))
+        if rows.size:
+            self.apply_cells(rows, columns, minutes[rows, columns], modified[rows, columns])
+
+    # Write cells back without going through itemChanged, then recompute only the rows that were touched
+    def apply_cells(self, rows, columns, minutes, modified=None):
+        self.modified[rows, columns] = int(time.time() * 1000) if modified is None else modified
+
+        # In order, so a cell that appears more than once ends on its last value
+        for row, column, value in zip(rows.tolist(), columns.tolist(), minutes.tolist()):
+            self.minutes[row, column] = value
+
+        if rows.size:
+            self.update_days(np.unique(rows))
+
+        self.write_cells(rows, columns)
+        self.update_undo_actions()
+
+    # Only the given cells get their text rendered
+    def write_cells(self, rows, columns):
+        table = self.ui.time_entry_table
+        table.blockSignals(True)
+        table.setUpdatesEnabled(False)
+        try:
+            for row, column in set(zip(rows.tolist(), columns.tolist())):
+                item = table.item(row, column)
+                if not item:
+                    item = QTableWidgetItem()
+                    table.setItem(row, column, item)
 
-    def get_minutes(self, time):
-        t1 = datetime.datetime.strptime(time, '%H:%M')
-        t2 = datetime.datetime(1900, 1, 1)
+                item.setText(self.punches.display(row, column))
+        finally:
+            table.setUpdatesEnabled(True)
+            table.blockSignals(False)
 
-        return (t1 - t2).total_seconds() / 60.0
+    def update_undo_actions(self):
+        self.ui.actionUndo.setEnabled(self.undo_stack.can_undo())
+        self.ui.actionRedo.setEnabled(self.undo_stack.can_redo())
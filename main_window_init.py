@@ -64,6 +64,23 @@ class Ui_TimeToWork(object):
         self.time_left_per_day_label.setFont(font)
         self.time_left_per_day_label.setObjectName("time_left_per_day_label")
         self.verticalLayout.addWidget(self.time_left_per_day_label)
+        self.flex_balance_label = QtWidgets.QLabel(self.centralwidget)
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.flex_balance_label.setFont(font)
+        self.flex_balance_label.setObjectName("flex_balance_label")
+        self.verticalLayout.addWidget(self.flex_balance_label)
+        self.leave_plan_label = QtWidgets.QLabel(self.centralwidget)
+        font = QtGui.QFont()
+        font.setPointSize(12)
+        self.leave_plan_label.setFont(font)
+        self.leave_plan_label.setWordWrap(True)
+        self.leave_plan_label.setObjectName("leave_plan_label")
+        self.verticalLayout.addWidget(self.leave_plan_label)
+        self.query_edit = QtWidgets.QLineEdit(self.centralwidget)
+        self.query_edit.setClearButtonEnabled(True)
+        self.query_edit.setObjectName("query_edit")
+        self.verticalLayout.addWidget(self.query_edit)
         self.horizontalLayout.addLayout(self.verticalLayout)
         TimeToWork.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(TimeToWork)
@@ -71,6 +88,12 @@ class Ui_TimeToWork(object):
         self.menubar.setObjectName("menubar")
         self.menuFile = QtWidgets.QMenu(self.menubar)
         self.menuFile.setObjectName("menuFile")
+        self.menuEdit = QtWidgets.QMenu(self.menubar)
+        self.menuEdit.setObjectName("menuEdit")
+        self.menuWeek = QtWidgets.QMenu(self.menubar)
+        self.menuWeek.setObjectName("menuWeek")
+        self.menuTools = QtWidgets.QMenu(self.menubar)
+        self.menuTools.setObjectName("menuTools")
         TimeToWork.setMenuBar(self.menubar)
         self.statusbar = QtWidgets.QStatusBar(TimeToWork)
         self.statusbar.setObjectName("statusbar")
@@ -79,9 +102,52 @@ class Ui_TimeToWork(object):
         self.actionSave.setObjectName("actionSave")
         self.actionLoad = QtWidgets.QAction(TimeToWork)
         self.actionLoad.setObjectName("actionLoad")
+        self.actionImport = QtWidgets.QAction(TimeToWork)
+        self.actionImport.setObjectName("actionImport")
+        self.actionExport = QtWidgets.QAction(TimeToWork)
+        self.actionExport.setObjectName("actionExport")
+        self.actionUndo = QtWidgets.QAction(TimeToWork)
+        self.actionUndo.setEnabled(False)
+        self.actionUndo.setObjectName("actionUndo")
+        self.actionRedo = QtWidgets.QAction(TimeToWork)
+        self.actionRedo.setEnabled(False)
+        self.actionRedo.setObjectName("actionRedo")
+        self.actionCopy = QtWidgets.QAction(TimeToWork)
+        self.actionCopy.setObjectName("actionCopy")
+        self.actionPaste = QtWidgets.QAction(TimeToWork)
+        self.actionPaste.setObjectName("actionPaste")
+        self.actionFillDown = QtWidgets.QAction(TimeToWork)
+        self.actionFillDown.setObjectName("actionFillDown")
+        self.actionFillRight = QtWidgets.QAction(TimeToWork)
+        self.actionFillRight.setObjectName("actionFillRight")
+        self.actionPreviousWeek = QtWidgets.QAction(TimeToWork)
+        self.actionPreviousWeek.setObjectName("actionPreviousWeek")
+        self.actionNextWeek = QtWidgets.QAction(TimeToWork)
+        self.actionNextWeek.setObjectName("actionNextWeek")
+        self.actionThisWeek = QtWidgets.QAction(TimeToWork)
+        self.actionThisWeek.setObjectName("actionThisWeek")
+        self.actionReports = QtWidgets.QAction(TimeToWork)
+        self.actionReports.setObjectName("actionReports")
         self.menuFile.addAction(self.actionSave)
         self.menuFile.addAction(self.actionLoad)
+        self.menuFile.addSeparator()
+        self.menuFile.addAction(self.actionImport)
+        self.menuFile.addAction(self.actionExport)
+        self.menuEdit.addAction(self.actionUndo)
+        self.menuEdit.addAction(self.actionRedo)
+        self.menuEdit.addSeparator()
+        self.menuEdit.addAction(self.actionCopy)
+        self.menuEdit.addAction(self.actionPaste)
+        self.menuEdit.addAction(self.actionFillDown)
+        self.menuEdit.addAction(self.actionFillRight)
+        self.menuWeek.addAction(self.actionPreviousWeek)
+        self.menuWeek.addAction(self.actionNextWeek)
+        self.menuWeek.addAction(self.actionThisWeek)
+        self.menuTools.addAction(self.actionReports)
         self.menubar.addAction(self.menuFile.menuAction())
+        self.menubar.addAction(self.menuEdit.menuAction())
+        self.menubar.addAction(self.menuWeek.menuAction())
+        self.menubar.addAction(self.menuTools.menuAction())
 
         self.retranslateUi(TimeToWork)
         QtCore.QMetaObject.connectSlotsByName(TimeToWork)
@@ -113,6 +179,33 @@ class Ui_TimeToWork(object):
         item.setText(_translate("TimeToWork", "Out"))
         self.time_left_label.setText(_translate("TimeToWork", "Time Left to Work:"))
         self.time_left_per_day_label.setText(_translate("TimeToWork", "Time Left to Work Per Day:"))
+        self.flex_balance_label.setText(_translate("TimeToWork", "Flex Balance:"))
+        self.leave_plan_label.setText(_translate("TimeToWork", "Leave Plan:"))
+        self.query_edit.setPlaceholderText(_translate("TimeToWork", "Search history, e.g. total > 10:00, start > 9:30, week_balance < 0"))
         self.menuFile.setTitle(_translate("TimeToWork", "File"))
+        self.menuEdit.setTitle(_translate("TimeToWork", "Edit"))
+        self.menuWeek.setTitle(_translate("TimeToWork", "Week"))
+        self.menuTools.setTitle(_translate("TimeToWork", "Tools"))
         self.actionSave.setText(_translate("TimeToWork", "Save"))
         self.actionLoad.setText(_translate("TimeToWork", "Load"))
+        self.actionImport.setText(_translate("TimeToWork", "Import..."))
+        self.actionExport.setText(_translate("TimeToWork", "Export..."))
+        self.actionUndo.setText(_translate("TimeToWork", "Undo"))
+        self.actionUndo.setShortcut(_translate("TimeToWork", "Ctrl+Z"))
+        self.actionRedo.setText(_translate("TimeToWork", "Redo"))
+        self.actionRedo.setShortcut(_translate("TimeToWork", "Ctrl+Y"))
+        self.actionCopy.setText(_translate("TimeToWork", "Copy"))
+        self.actionCopy.setShortcut(_translate("TimeToWork", "Ctrl+C"))
+        self.actionPaste.setText(_translate("TimeToWork", "Paste"))
+        self.actionPaste.setShortcut(_translate("TimeToWork", "Ctrl+V"))
+        self.actionFillDown.setText(_translate("TimeToWork", "Fill Down"))
+        self.actionFillDown.setShortcut(_translate("TimeToWork", "Ctrl+D"))
+        self.actionFillRight.setText(_translate("TimeToWork", "Fill Right"))
+        self.actionFillRight.setShortcut(_translate("TimeToWork", "Ctrl+R"))
+        self.actionPreviousWeek.setText(_translate("TimeToWork", "Previous Week"))
+        self.actionPreviousWeek.setShortcut(_translate("TimeToWork", "Alt+Left"))
+        self.actionNextWeek.setText(_translate("TimeToWork", "Next Week"))
+        self.actionNextWeek.setShortcut(_translate("TimeToWork", "Alt+Right"))
+        self.actionThisWeek.setText(_translate("TimeToWork", "This Week"))
+        self.actionThisWeek.setShortcut(_translate("TimeToWork", "Alt+Home"))
+        self.actionReports.setText(_translate("TimeToWork", "Reports"))
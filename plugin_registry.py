@@ -0,0 +1,132 @@
+import ast
+import importlib
+import json
+import os
+from pkgutil import iter_modules
+
+# Local imports
+from common import find_modules, get_class_from_string, resource_path, atomic_write
+
+PLUGIN_PACKAGE = 'plugins'
+PLUGIN_KINDS = ('importers', 'exporters', 'rule_sets')
+MANIFEST_FILE_NAME = 'plugin_manifest.json'
+MANIFEST_VERSION = 1
+
+
+# A plugin module declares itself with a literal module level dict, e.g.
+#   PLUGIN = {'name': 'CSV', 'class': 'CsvImporter', 'extensions': ['csv']}
+# which is read from the source so discovering plugins never imports them
+def read_plugin_info(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=str(path))
+
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == 'PLUGIN' for t in node.targets):
+            return ast.literal_eval(node.value)
+
+    return None
+
+
+# Import/export formats and rule sets found under the plugins package. What was found is cached in a manifest keyed
+# on the mtimes of the package directories and plugin files, so a normal start only stats them; plugin modules are
+# imported the first time one of their classes is asked for
+class PluginRegistry:
+    def __init__(self, cache_directory, root=None):
+        self.root = root or resource_path('')
+        self.manifest_path = cache_directory / MANIFEST_FILE_NAME
+        self.manifest = {'version': MANIFEST_VERSION, 'directories': {}, 'files': {}}
+        self.classes = {}
+        self.warnings = []      # Plugins skipped and manifest writes that failed, for the GUI to show
+
+    def discover(self):
+        cached = self.read_manifest()
+        if cached and all(self.mtime(path) == mtime for path, mtime in cached['directories'].items()):
+            self.manifest = cached
+            self.update_files(cached['files'])
+        else:
+            self.walk(cached['files'] if cached else {})
+
+        return self
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+    def write_manifest(self):
+        try:
+            atomic_write(self.manifest_path, json.dumps(self.manifest).encode('utf-8'))
+        except OSError as e:
+            self.warnings.append(f'Could not write plugin manifest: {e}')
+
+    def mtime(self, path):
+        try:
+            return os.stat(self.root / path).st_mtime_ns
+        except OSError:
+            return None
+
+    # Full walk of the plugin packages, reusing cached entries of files that haven't changed
+    def walk(self, cached_files):
+        directories = {}
+        modules = []
+        for package in find_modules(PLUGIN_PACKAGE, self.root):
+            directory = package.replace('.', '/')
+            directories[directory] = self.mtime(directory)
+            modules += [(f'{package}.{module.name}', f'{directory}/{module.name}.py')
+                        for module in iter_modules([str(self.root / directory)]) if not module.ispkg]
+
+        files = {}
+        for module, path in modules:
+            files[path] = cached_files.get(path) or {'module': module}
+
+        self.manifest = {'version': MANIFEST_VERSION, 'directories': directories, 'files': files}
+        self.update_files(files, changed=True)
+
+    # Re-read the declarations of files whose mtime differs from the manifest
+    def update_files(self, files, changed=False):
+        for path, entry in files.items():
+            mtime = self.mtime(path)
+            if entry.get('mtime') == mtime:
+                continue
+
+            try:
+                info = read_plugin_info(self.root / path)
+            except (OSError, SyntaxError, ValueError) as e:
+                self.warnings.append(f'Skipping plugin {path}: {e}')
+                info = None
+
+            entry['mtime'] = mtime
+            entry['plugin'] = info
+            changed = True
+
+        if changed:
+            self.write_manifest()
+
+    # Declarations of every plugin of a kind, without importing any of them
+    def plugins(self, kind):
+        found = []
+        for entry in self.manifest['files'].values():
+            if entry.get('plugin') and entry['module'].split('.')[1:2] == [kind]:
+                found.append({**entry['plugin'], 'module': entry['module']})
+
+        return sorted(found, key=lambda plugin: plugin['name'])
+
+    def names(self, kind):
+        return [plugin['name'] for plugin in self.plugins(kind)]
+
+    # The plugin's class, importing its module on first use
+    def get(self, kind, name):
+        key = (kind, name)
+        if key not in self.classes:
+            plugin = next((plugin for plugin in self.plugins(kind) if plugin['name'] == name), None)
+            if plugin is None:
+                raise KeyError(f'No {kind} plugin named {name!r}')
+
+            importlib.import_module(plugin['module'])
+            self.classes[key] = get_class_from_string(f'{plugin["module"]}.{plugin["class"]}')
+
+        return self.classes[key]
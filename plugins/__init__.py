@@ -0,0 +1,4 @@
+# Plugins found by plugin_registry.PluginRegistry. Each subpackage holds one kind of plugin:
+#   importers: class with read(path) -> {week_start: 7x4 minutes grid}
+#   exporters: class with write(path, weeks), weeks as {week_start: 7x4 minutes grid}
+#   rule_sets: class with rules() -> work rules dict (see work_rules.DEFAULT_RULES)
@@ -0,0 +1,24 @@
+import csv
+import datetime
+
+# Local imports
+from week_engine import NO_TIME
+
+PLUGIN = {'name': 'CSV punches', 'class': 'CsvPunchExporter', 'extensions': ['csv']}
+
+
+# Same layout CsvPunchImporter reads, skipping days without any punches
+class CsvPunchExporter:
+    def write(self, path, weeks):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['date', 'in', 'out', 'in', 'out'])
+
+            for week_start in sorted(weeks):
+                for day, row in enumerate(weeks[week_start].tolist()):
+                    if all(minutes == NO_TIME for minutes in row):
+                        continue
+
+                    date = week_start + datetime.timedelta(days=day)
+                    writer.writerow([date.isoformat()] + ['' if minutes == NO_TIME else
+                                                          f'{minutes // 60:02d}:{minutes % 60:02d}' for minutes in row])
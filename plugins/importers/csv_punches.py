@@ -0,0 +1,35 @@
+import csv
+import datetime
+
+# Local imports
+from week_engine import parse_minutes
+from week_history import COLUMNS, empty_week, week_start_of
+
+PLUGIN = {'name': 'CSV punches', 'class': 'CsvPunchImporter', 'extensions': ['csv']}
+
+
+# One row per day: date (YYYY-MM-DD) followed by up to four HH:MM punches (In, Out, In, Out)
+class CsvPunchImporter:
+    def read(self, path):
+        weeks = {}
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            for line_number, row in enumerate(csv.reader(f), 1):
+                if not row or not row[0].strip() or row[0].startswith('#'):
+                    continue
+
+                try:
+                    date = datetime.date.fromisoformat(row[0].strip())
+                except ValueError:
+                    # Header line
+                    if line_number == 1:
+                        continue
+                    raise
+
+                week_start = week_start_of(date)
+                if week_start not in weeks:
+                    weeks[week_start] = empty_week()
+
+                for column, text in enumerate(row[1:COLUMNS + 1]):
+                    weeks[week_start][date.weekday(), column] = parse_minutes(text.strip())
+
+        return weeks
@@ -0,0 +1,12 @@
+PLUGIN = {'name': 'German working time', 'class': 'GermanWorkingTime'}
+
+
+# Arbeitszeitgesetz minimum breaks: 30 minutes after 6h, 45 minutes after 9h
+class GermanWorkingTime:
+    def rules(self):
+        return {
+            'breaks': [
+                {'after_minutes': 360, 'break_minutes': 30},
+                {'after_minutes': 540, 'break_minutes': 45},
+            ],
+        }
@@ -0,0 +1,124 @@
+import getpass
+import json
+import sys
+
+# Only QtCore/QtNetwork are imported here so handing a command to a running instance stays cheap
+from PyQt5.QtCore import QObject
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+SERVER_NAME = f'TimeToWork-{getpass.getuser()}'
+TIMEOUT_MS = 1000
+COMMANDS = ('show', 'punch_in', 'punch_out', 'remaining')
+
+
+# Protocol: one JSON object per line each way.
+# Request {"command": "punch_in"}, reply {"ok": true, "result": ...} or {"ok": false, "error": "..."}
+def send_command(command, server_name=SERVER_NAME, timeout=TIMEOUT_MS):
+    socket = QLocalSocket()
+    socket.connectToServer(server_name)
+
+    # No running instance
+    if not socket.waitForConnected(timeout):
+        return None
+
+    socket.write(json.dumps({'command': command}).encode('utf-8') + b'\n')
+    socket.waitForBytesWritten(timeout)
+
+    data = b''
+    while not data.endswith(b'\n') and socket.waitForReadyRead(timeout):
+        data += bytes(socket.readAll())
+    socket.disconnectFromServer()
+
+    if not data:
+        return {'ok': False, 'error': 'No reply from running instance'}
+
+    return json.loads(data.decode('utf-8'))
+
+
+# Whether an instance is listening on the name, without sending it anything
+def is_running(server_name=SERVER_NAME, timeout=TIMEOUT_MS):
+    socket = QLocalSocket()
+    socket.connectToServer(server_name)
+    if not socket.waitForConnected(timeout):
+        return False
+
+    socket.abort()
+    return True
+
+
+def print_reply(reply):
+    if reply['ok']:
+        print(reply['result'])
+    else:
+        print(reply['error'], file=sys.stderr)
+
+
+class PunchServer(QObject):
+    def __init__(self, handlers, server_name=SERVER_NAME, parent=None):
+        super().__init__(parent)
+
+        self.handlers = handlers    # Command name -> callable returning a JSON serializable result
+        self.server_name = server_name
+
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.accept_connections)
+
+    def listen(self):
+        if self.server.listen(self.server_name):
+            return True
+
+        # The name is only taken over when nothing answers on it, i.e. it's left over from an instance that didn't
+        # shut down cleanly. An instance started at the same time as this one keeps it
+        if is_running(self.server_name):
+            return False
+
+        QLocalServer.removeServer(self.server_name)
+        return self.server.listen(self.server_name)
+
+    def accept_connections(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda s=socket: self.read_requests(s))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def read_requests(self, socket):
+        while socket.canReadLine():
+            reply = self.handle_request(bytes(socket.readLine()))
+            socket.write(json.dumps(reply).encode('utf-8') + b'\n')
+            socket.flush()
+
+    def handle_request(self, line):
+        try:
+            command = json.loads(line.decode('utf-8'))['command']
+        except (ValueError, KeyError, TypeError):
+            return {'ok': False, 'error': f'Unknown request, expected one of: {", ".join(self.handlers)}'}
+
+        return self.run(command)
+
+    # Run a command in this instance, replying as if it had been sent over the socket
+    def run(self, command):
+        try:
+            handler = self.handlers[command]
+        except (KeyError, TypeError):
+            return {'ok': False, 'error': f'Unknown request, expected one of: {", ".join(self.handlers)}'}
+
+        try:
+            return {'ok': True, 'result': handler()}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+
+# Lightweight client for scripts and hotkeys, e.g. `python punch_ipc.py punch_in`
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'show'
+    if command not in COMMANDS:
+        print(f'Usage: punch_ipc.py [{"|".join(COMMANDS)}]', file=sys.stderr)
+        sys.exit(2)
+
+    reply = send_command(command)
+    if reply is None:
+        print('TimeToWork is not running', file=sys.stderr)
+        sys.exit(1)
+
+    print_reply(reply)
+    sys.exit(0 if reply['ok'] else 1)
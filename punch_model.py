@@ -0,0 +1,116 @@
+import datetime
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from week_engine import NO_TIME, MINUTES_PER_DAY
+
+NO_PUNCH = np.iinfo(np.int32).min
+
+
+def local_epoch_minutes(date, minutes=0):
+    local = datetime.datetime.combine(date, datetime.time()) + datetime.timedelta(minutes=minutes)
+
+    # Naive datetimes are taken as local time, including the DST rules in effect on that date
+    return int(local.timestamp() // 60)
+
+
+# Absolute punch times for rows of clock minutes, one date per row. Each punch is on the same day as the one before it
+# in the row unless its clock time is earlier, in which case the shift crossed midnight and it's on the next day.
+# Returns int32 minutes since the epoch, NO_PUNCH for empty cells
+def epoch_minutes(dates, minutes):
+    minutes = np.asarray(minutes)
+    minutes = minutes.reshape(-1, minutes.shape[-1])
+    valid = minutes != NO_TIME
+
+    day_offsets = np.zeros(minutes.shape, dtype=np.int64)
+    offset = np.zeros(minutes.shape[0], dtype=np.int64)
+    previous = np.full(minutes.shape[0], -1)
+    for j in range(minutes.shape[1]):
+        offset += valid[:, j] & (minutes[:, j] < previous)
+        day_offsets[:, j] = offset
+        previous = np.where(valid[:, j], minutes[:, j], previous)
+
+    # Local midnight of every day a punch can fall on, looked up once per distinct day
+    first_day = min(dates) if len(dates) else datetime.date.today()
+    day_numbers = np.array([(date - first_day).days for date in dates], dtype=np.int64)[:, None] + day_offsets
+    num_days = int(day_numbers.max()) + 2 if day_numbers.size else 1
+    midnights = np.array([local_epoch_minutes(first_day + datetime.timedelta(days=i)) for i in range(num_days)],
+                         dtype=np.int64)
+
+    epoch = midnights[day_numbers] + minutes
+
+    # Days that aren't 24h long have a DST change, so punches on them need the exact local offset
+    transition_days = np.flatnonzero(np.diff(midnights) != MINUTES_PER_DAY)
+    for i, j in np.argwhere(valid & np.isin(day_numbers, transition_days)):
+        epoch[i, j] = local_epoch_minutes(first_day + datetime.timedelta(days=int(day_numbers[i, j])),
+                                          int(minutes[i, j]))
+
+    return np.where(valid, epoch, NO_PUNCH).astype(np.int32)
+
+
+# Elapsed minutes of each In/Out pair, 0 where either punch is missing
+def pair_durations(epoch):
+    ins = epoch[:, 0::2].astype(np.int64)
+    outs = epoch[:, 1::2].astype(np.int64)
+
+    return np.where((ins != NO_PUNCH) & (outs != NO_PUNCH), outs - ins, 0)
+
+
+# Pairs whose Out is earlier on the clock than their In are taken to cross midnight. One lasting longer than
+# max_minutes is far more likely a typo (e.g. In and Out swapped) than a shift, so like any reversed pair before shifts
+# across midnight were counted it counts nothing
+def cap_overnight(minutes, durations, max_minutes):
+    minutes = np.asarray(minutes)
+    minutes = minutes.reshape(-1, minutes.shape[-1])
+    overnight = minutes[:, 1::2] < minutes[:, 0::2]
+
+    return np.where(overnight & (durations > max_minutes), 0, durations)
+
+
+# Elapsed minutes of each pair of rows of clock minutes on the given dates, see epoch_minutes and cap_overnight
+def local_durations(dates, minutes, max_overnight):
+    return cap_overnight(minutes, pair_durations(epoch_minutes(dates, minutes)), max_overnight)
+
+
+# Dates of every row of a batch of weeks, given each week's Monday
+def week_dates(week_starts, days_per_week=7):
+    return [week_start + datetime.timedelta(days=i) for week_start in week_starts for i in range(days_per_week)]
+
+
+# The week in the table as absolute punches. Rows are re-derived from the table's clock minutes when edited, and
+# HH:MM text is only produced for cells that are actually written to the table
+class PunchWeek:
+    __slots__ = ('week_start', 'minutes', 'epoch', 'display_cache')
+
+    def __init__(self, week_start, minutes):
+        self.week_start = week_start
+        self.minutes = minutes      # Shared with the table's minutes grid
+        self.epoch = epoch_minutes(self.dates(range(minutes.shape[0])), minutes)
+        self.display_cache = {}
+
+    def dates(self, rows):
+        return [self.week_start + datetime.timedelta(days=int(row)) for row in rows]
+
+    def update_rows(self, rows):
+        rows = np.asarray(rows, dtype=int)
+        self.epoch[rows] = epoch_minutes(self.dates(rows), self.minutes[rows])
+
+        for key in [key for key in self.display_cache if key[0] in set(rows.tolist())]:
+            del self.display_cache[key]
+
+    def durations(self, rows, max_overnight):
+        rows = np.asarray(rows, dtype=int)
+        return cap_overnight(self.minutes[rows], pair_durations(self.epoch[rows]), max_overnight)
+
+    # The clock time as typed; the epoch can't be used for this, as on a DST change it may name another hour (02:30
+    # on the day clocks go forward is 03:30)
+    def display(self, row, column):
+        text = self.display_cache.get((row, column))
+        if text is None:
+            minutes = int(self.minutes[row, column])
+            text = '' if minutes == NO_TIME else f'{minutes // 60:02d}:{minutes % 60:02d}'
+            self.display_cache[(row, column)] = text
+
+        return text
@@ -0,0 +1,138 @@
+import datetime
+import re
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from punch_model import local_durations, week_dates
+from week_engine import NO_TIME, day_totals, day_bounds
+from week_history import DAYS_PER_WEEK, WeekHistory
+from work_rules import CompiledRules
+
+DAY_FIELDS = ('start', 'end', 'total')
+WEEK_FIELDS = ('week_total', 'week_balance')
+
+# e.g. 'total > 10:00', 'start >= 9:30', 'week_balance < 0'
+QUERY_REGEX = re.compile(r'\s*(\w+)\s*(>=|<=|>|<|=)\s*(-?)(\d+(?::\d{1,2}|\.\d*)?)\s*')
+
+
+def parse_query_minutes(sign, value):
+    if ':' in value:
+        hours, minutes = value.split(':')
+        minutes = int(hours) * 60 + int(minutes)
+    else:
+        minutes = round(float(value) * 60)
+
+    return -minutes if sign else minutes
+
+
+# Values of one field kept sorted along with the id (day or week number) each value belongs to, so comparisons are
+# a binary search and a slice
+class SortedIndex:
+    def __init__(self):
+        self.values = np.empty(0, dtype=np.int64)
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def remove(self, ids):
+        keep = ~np.isin(self.ids, ids)
+        self.values = self.values[keep]
+        self.ids = self.ids[keep]
+
+    def insert(self, values, ids):
+        order = np.argsort(values, kind='stable')
+        values = np.asarray(values, dtype=np.int64)[order]
+        positions = np.searchsorted(self.values, values, side='right')
+
+        self.values = np.insert(self.values, positions, values)
+        self.ids = np.insert(self.ids, positions, np.asarray(ids, dtype=np.int64)[order])
+
+    def select(self, operator, value):
+        if operator == '>':
+            return self.ids[np.searchsorted(self.values, value, side='right'):]
+        elif operator == '>=':
+            return self.ids[np.searchsorted(self.values, value, side='left'):]
+        elif operator == '<':
+            return self.ids[:np.searchsorted(self.values, value, side='left')]
+        elif operator == '<=':
+            return self.ids[:np.searchsorted(self.values, value, side='right')]
+
+        low = np.searchsorted(self.values, value, side='left')
+        high = np.searchsorted(self.values, value, side='right')
+        return self.ids[low:high]
+
+
+# Sorted per-field indexes over the stored weeks. Days are identified by their ordinal, weeks by their Monday's
+# ordinal; only weeks whose history revision changed are re-indexed
+class PunchIndex:
+    def __init__(self, history, rules):
+        self.history = history
+        self.rules = rules
+        self.revisions = {}
+        self.indexes = {field: SortedIndex() for field in DAY_FIELDS + WEEK_FIELDS}
+
+    def refresh(self):
+        stale = [week_start for week_start, revision in self.history.revisions.items()
+                 if self.revisions.get(week_start) != revision]
+        removed = self.revisions.keys() - self.history.revisions.keys()
+
+        if stale or removed:
+            self.reindex(stale, removed)
+
+        return self
+
+    def reindex(self, stale, removed):
+        changed = list(stale) + list(removed)
+        week_ids = np.array([week_start.toordinal() for week_start in changed], dtype=np.int64)
+        day_ids = (week_ids[:, None] + np.arange(DAYS_PER_WEEK)).ravel()
+
+        for field in DAY_FIELDS:
+            self.indexes[field].remove(day_ids)
+        for field in WEEK_FIELDS:
+            self.indexes[field].remove(week_ids)
+
+        for week_start in removed:
+            del self.revisions[week_start]
+
+        if not stale:
+            return
+
+        week_ids = week_ids[:len(stale)]
+        minutes = np.stack([self.history.weeks[week_start] for week_start in stale])
+        days = minutes.reshape(-1, minutes.shape[-1])
+        day_ids = (week_ids[:, None] + np.arange(DAYS_PER_WEEK)).ravel()
+
+        worked, _ = day_totals(days, local_durations(week_dates(stale), days, self.rules.max_day_minutes))
+        worked = self.rules.apply_breaks(worked, days)
+        start, end = day_bounds(days, worked)
+        worked_days = worked > 0
+
+        self.indexes['start'].insert(start[worked_days], day_ids[worked_days])
+        has_end = end != NO_TIME
+        self.indexes['end'].insert(end[has_end], day_ids[has_end])
+        self.indexes['total'].insert(worked[worked_days], day_ids[worked_days])
+
+        week_totals = worked.reshape(-1, DAYS_PER_WEEK).sum(axis=1)
+        targets = np.array([self.rules.daily_requirements(week_start, DAYS_PER_WEEK).sum() for week_start in stale])
+        self.indexes['week_total'].insert(week_totals, week_ids)
+        self.indexes['week_balance'].insert(week_totals - targets, week_ids)
+
+        for week_start in stale:
+            self.revisions[week_start] = self.history.revisions[week_start]
+
+    # Returns the matching dates (days for day fields, Mondays for week fields) in chronological order
+    def query(self, text):
+        match = QUERY_REGEX.fullmatch(text)
+        if not match or match.group(1) not in self.indexes:
+            raise ValueError(f'Expected "<field> <op> <time>" with field one of {", ".join(self.indexes)}, '
+                             f'e.g. "total > 10:00"')
+
+        field, operator, sign, value = match.groups()
+        ids = np.sort(self.refresh().indexes[field].select(operator, parse_query_minutes(sign, value)))
+
+        return [datetime.date.fromordinal(int(i)) for i in ids]
+
+
+# Headless query straight from the stored weeks
+def query_history(directory, text):
+    return PunchIndex(WeekHistory(directory).load(), CompiledRules.load(directory)).query(text)
@@ -0,0 +1,81 @@
+import time
+
+# Third party imports
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWidgets import QMessageBox
+
+# Local imports
+from common import TimerWheel
+from common.qt import TimeoutMessageBox, display_message
+
+LEAVE = 'leave'
+BREAK = 'break'
+CLOCK_OUT = 'clock_out'
+
+BREAK_AFTER_MINUTES = 360           # Mandatory break after 6h, unless the work rules say otherwise
+FORGOT_CLOCK_OUT_MINUTES = 600      # Still punched in 10h later
+REMINDER_TIMEOUT = 60               # Seconds a reminder stays up
+
+# QTimer intervals are int32 milliseconds, so sleep a day at most and let the wheel decide again
+MAX_SLEEP_MS = 24 * 60 * 60 * 1000
+
+
+def now_minutes():
+    return int(time.time() // 60)
+
+
+# Reminders kept in a timer wheel over epoch minutes and driven by one single-shot QTimer set to the wheel's next
+# due time, so nothing runs in between. Each reminder has a fixed key and rescheduling one replaces it in O(1)
+class ReminderScheduler(QObject):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.wheel = TimerWheel(now_minutes())
+        self.reminders = {}     # Key -> (title, text, callback run when the reminder is accepted)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.wake)
+
+    def schedule(self, key, due, title, text, accepted=None):
+        self.reminders[key] = (title, text, accepted)
+        self.wheel.schedule(key, due)
+        self.rearm()
+
+    def cancel(self, key):
+        if key in self.wheel:
+            self.wheel.cancel(key)
+            self.rearm()
+
+    def rearm(self):
+        due = self.wheel.next_due()
+        if due is None:
+            self.timer.stop()
+            return
+
+        self.timer.start(int(min(max(due * 60 - time.time(), 0) * 1000, MAX_SLEEP_MS)))
+
+    def wake(self):
+        for key, _ in self.wheel.advance(now_minutes()):
+            self.show(*self.reminders.pop(key))
+
+        self.rearm()
+
+    def show(self, title, text, accepted):
+        if accepted:
+            message_box = TimeoutMessageBox(QMessageBox.Information, title, text, timeout=REMINDER_TIMEOUT,
+                                            default_result=QMessageBox.Cancel, default_text='Dismiss',
+                                            parent=self.parent())
+            message_box.button(QMessageBox.Ok).setText('Punch out')
+        else:
+            message_box = TimeoutMessageBox(QMessageBox.Information, title, text, timeout=REMINDER_TIMEOUT,
+                                            default_result=QMessageBox.Ok, default_text='OK', parent=self.parent())
+            message_box.setStandardButtons(QMessageBox.Ok)
+            message_box.update_default_button_text()
+
+        if message_box.exec() == QMessageBox.Ok and accepted:
+            # Things may have moved on while the reminder was up, e.g. punched out some other way
+            try:
+                accepted()
+            except ValueError as e:
+                display_message(QMessageBox.Warning, title, str(e))
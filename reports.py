@@ -0,0 +1,138 @@
+import datetime
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from punch_model import local_durations, week_dates
+from week_engine import NO_TIME, day_totals, day_bounds
+from week_history import DAYS_PER_WEEK, COLUMNS
+
+HISTOGRAM_BINS = np.arange(0, 16 * 60 + 1, 30)     # Daily worked minutes, half hour bins up to 16h
+
+# Layout of the per-week statistics row; weeks are summed column-wise to build a report
+STATISTIC_FIELDS = [
+    ('start_sum', 1), ('start_count', 1),
+    ('end_sum', 1), ('end_count', 1),
+    ('break_sum', 1), ('break_count', 1),
+    ('weekday_minutes', DAYS_PER_WEEK), ('weekday_count', DAYS_PER_WEEK),
+    ('histogram', HISTOGRAM_BINS.size - 1),
+    ('week_total', 1),
+]
+_offsets = np.cumsum([0] + [size for _, size in STATISTIC_FIELDS]).tolist()
+STATISTIC_SLICES = {name: slice(start, stop)
+                    for (name, _), start, stop in zip(STATISTIC_FIELDS, _offsets, _offsets[1:])}
+STATISTIC_COLUMNS = _offsets[-1]
+
+
+# Statistics for a batch of weeks at once: minutes is (n_weeks, 7, 4), returns (n_weeks, STATISTIC_COLUMNS). Worked
+# minutes have the rules' automatic breaks deducted, as in the table's labels
+def week_statistics(week_starts, minutes, rules):
+    num_weeks = minutes.shape[0]
+    days = minutes.reshape(-1, COLUMNS)
+    worked, _ = day_totals(days, local_durations(week_dates(week_starts), days, rules.max_day_minutes))
+    worked = rules.apply_breaks(worked, days)
+    worked_days = worked > 0
+
+    start, end = day_bounds(days, worked)
+    has_end = end != NO_TIME
+    start = np.where(worked_days, start, 0)
+    end = np.where(has_end, end, 0)
+
+    # Breaks are the gap between the two pairs
+    second_pair = worked_days & np.all(days != NO_TIME, axis=1)
+    breaks = np.where(second_pair, days[:, 2] - days[:, 1], 0)
+    has_break = second_pair & (breaks > 0)
+
+    def per_week(values):
+        return values.reshape(num_weeks, DAYS_PER_WEEK)
+
+    bins = np.clip(np.digitize(worked, HISTOGRAM_BINS) - 1, 0, HISTOGRAM_BINS.size - 2)
+    histogram = np.zeros((num_weeks * DAYS_PER_WEEK, HISTOGRAM_BINS.size - 1), dtype=np.int64)
+    histogram[np.flatnonzero(worked_days), bins[worked_days]] = 1
+
+    statistics = np.zeros((num_weeks, STATISTIC_COLUMNS), dtype=np.int64)
+    statistics[:, STATISTIC_SLICES['start_sum']] = per_week(start).sum(axis=1, keepdims=True)
+    statistics[:, STATISTIC_SLICES['start_count']] = per_week(worked_days).sum(axis=1, keepdims=True)
+    statistics[:, STATISTIC_SLICES['end_sum']] = per_week(end).sum(axis=1, keepdims=True)
+    statistics[:, STATISTIC_SLICES['end_count']] = per_week(has_end).sum(axis=1, keepdims=True)
+    statistics[:, STATISTIC_SLICES['break_sum']] = per_week(np.where(has_break, breaks, 0)).sum(axis=1, keepdims=True)
+    statistics[:, STATISTIC_SLICES['break_count']] = per_week(has_break).sum(axis=1, keepdims=True)
+    statistics[:, STATISTIC_SLICES['weekday_minutes']] = per_week(worked)
+    statistics[:, STATISTIC_SLICES['weekday_count']] = per_week(worked_days)
+    statistics[:, STATISTIC_SLICES['histogram']] = histogram.reshape(num_weeks, DAYS_PER_WEEK, -1).sum(axis=1)
+    statistics[:, STATISTIC_SLICES['week_total']] = per_week(worked).sum(axis=1, keepdims=True)
+
+    return statistics
+
+
+def _average(total, count):
+    return total / count if count else None
+
+
+# Per-week statistics are cached against the history's week revisions, so only weeks that changed since the last
+# report are recomputed (in one vectorized batch) before the cached rows are summed
+class ReportCache:
+    def __init__(self, history, rules):
+        self.history = history
+        self.rules = rules
+        self.rows = {}  # Week start -> (revision, statistics row)
+
+    def statistics(self):
+        stale = [week_start for week_start, revision in self.history.revisions.items()
+                 if self.rows.get(week_start, (None,))[0] != revision]
+
+        if stale:
+            minutes = np.stack([self.history.weeks[week_start] for week_start in stale])
+            rows = week_statistics(stale, minutes, self.rules)
+            for week_start, row in zip(stale, rows):
+                self.rows[week_start] = (self.history.revisions[week_start], row)
+
+        # Forget weeks that are no longer in the history
+        for week_start in self.rows.keys() - self.history.revisions.keys():
+            del self.rows[week_start]
+
+        week_starts = sorted(self.rows)
+        if not week_starts:
+            return week_starts, np.zeros((0, STATISTIC_COLUMNS), dtype=np.int64)
+
+        return week_starts, np.stack([self.rows[week_start][1] for week_start in week_starts])
+
+    def report(self, start=None, end=None):
+        week_starts, statistics = self.statistics()
+
+        # Optionally restrict to weeks starting in [start, end)
+        dates = np.array(week_starts, dtype='datetime64[D]')
+        mask = np.ones(dates.size, dtype=bool)
+        if start:
+            mask &= dates >= np.datetime64(start)
+        if end:
+            mask &= dates < np.datetime64(end)
+        dates = dates[mask]
+        statistics = statistics[mask]
+
+        totals = statistics.sum(axis=0)
+
+        def total(name):
+            return totals[STATISTIC_SLICES[name]]
+
+        weekday_count = total('weekday_count')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hours_per_weekday = np.where(weekday_count, total('weekday_minutes') / weekday_count / 60, 0)
+
+        week_totals = statistics[:, STATISTIC_SLICES['week_total']].ravel()
+
+        # Weekly trend as the slope of a least squares fit, in minutes per week
+        trend = np.polyfit(np.arange(week_totals.size), week_totals, 1)[0] if week_totals.size > 1 else 0.0
+
+        return {
+            'weeks': dates.astype(datetime.date).tolist(),
+            'average_start': _average(*total('start_sum'), *total('start_count')),
+            'average_end': _average(*total('end_sum'), *total('end_count')),
+            'average_break': _average(*total('break_sum'), *total('break_count')),
+            'hours_per_weekday': hours_per_weekday,
+            'week_totals': week_totals,
+            'weekly_trend': trend,
+            'histogram_bins': HISTOGRAM_BINS,
+            'histogram': total('histogram'),
+        }
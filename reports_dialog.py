@@ -0,0 +1,59 @@
+from PyQt5 import QtWidgets
+from PyQt5.QtCore import Qt
+
+from week_engine import format_duration
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def format_clock(minutes):
+    return '-' if minutes is None else format_duration(round(minutes))
+
+
+class ReportsDialog(QtWidgets.QDialog):
+    def __init__(self, report, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Reports')
+        self.setAttribute(Qt.WA_DeleteOnClose, True)
+
+        rows = [
+            ('Weeks', str(len(report['weeks']))),
+            ('Average start', format_clock(report['average_start'])),
+            ('Average end', format_clock(report['average_end'])),
+            ('Average break', format_clock(report['average_break'])),
+            ('Weekly trend (per week)', format_clock(report['weekly_trend'])),
+        ]
+        rows += [(f'Hours on {day}', format_clock(hours * 60))
+                 for day, hours in zip(WEEKDAYS, report['hours_per_weekday'])]
+
+        # Daily distribution as (bin start, days) pairs, skipping empty bins
+        bins = report['histogram_bins']
+        rows += [(f'Days {format_clock(bins[i])}-{format_clock(bins[i + 1])}', str(count))
+                 for i, count in enumerate(report['histogram']) if count]
+
+        table = QtWidgets.QTableWidget(len(rows), 2, self)
+        table.setHorizontalHeaderLabels(['Statistic', 'Value'])
+        table.verticalHeader().hide()
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        for i, (name, value) in enumerate(rows):
+            table.setItem(i, 0, QtWidgets.QTableWidgetItem(name))
+            table.setItem(i, 1, QtWidgets.QTableWidgetItem(value))
+        table.resizeColumnsToContents()
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(table)
+        self.resize(400, 500)
+
+
+class QueryResultsDialog(QtWidgets.QDialog):
+    def __init__(self, query, dates, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f'{query} ({len(dates)} found)')
+        self.setAttribute(Qt.WA_DeleteOnClose, True)
+
+        results = QtWidgets.QListWidget(self)
+        results.addItems([f'{WEEKDAYS[date.weekday()]} {date.isoformat()}' for date in dates])
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(results)
+        self.resize(300, 400)
@@ -0,0 +1,60 @@
+import csv
+import io
+import re
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from week_engine import NO_TIME, parse_minutes_array
+
+DATE_REGEX = re.compile(r'[0-9]{4}-[0-9]{2}-[0-9]{2}')
+
+
+# Clipboard text as a rectangular array of cells. Spreadsheets copy tab separated rows; anything without tabs is
+# read as CSV, separated by whichever of ';' and ',' shows up first
+def split_block(text):
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').rstrip('\n')
+    if not lines:
+        return np.empty((0, 0), dtype=str)
+
+    if '\t' in lines:
+        rows = [line.split('\t') for line in lines.split('\n')]
+    else:
+        delimiter = ';' if ';' in lines and (',' not in lines or lines.index(';') < lines.index(',')) else ','
+        rows = list(csv.reader(io.StringIO(lines), delimiter=delimiter))
+
+    width = max(len(row) for row in rows)
+    return np.array([[cell.strip() for cell in row] + [''] * (width - len(row)) for row in rows], dtype=str)
+
+
+# Leading ISO dates (YYYY-MM-DD) of a block where every row starts with one, None otherwise. numpy would also take
+# '2024' or '2024-03' as dates, so the format is checked first
+def block_dates(cells):
+    if not cells.size or not all(DATE_REGEX.fullmatch(cell) for cell in cells[:, 0].tolist()):
+        return None
+
+    try:
+        dates = cells[:, 0].astype('datetime64[D]')
+    except ValueError:
+        return None
+
+    return None if np.isnat(dates).any() else dates
+
+
+# Parsed block: minutes for every cell (NO_TIME where empty) and the positions of non-empty cells that aren't times,
+# so a paste can be rejected as a whole before anything changes
+def parse_block(cells):
+    minutes = parse_minutes_array(cells)
+    invalid = np.argwhere((minutes == NO_TIME) & (cells != ''))
+
+    return minutes, invalid
+
+
+# Fill a block of minutes down (axis 0) or right (axis 1) from its first row/column, like a spreadsheet drag-fill
+def fill_block(minutes, axis=0):
+    return np.repeat(np.take(minutes, [0], axis=axis), minutes.shape[axis], axis=axis)
+
+
+def format_block(texts):
+    return '\n'.join('\t'.join(row) for row in texts) + '\n'
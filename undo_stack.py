@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+
+# Third party imports
+import numpy as np
+
+
+# Undo/redo history of table cell edits. Only (row, column, old, new) minute diffs are kept, in a preallocated ring
+# buffer, so memory use is fixed no matter how many edits are made. Diffs pushed inside group() share a step and are
+# undone/redone together.
+# Since minutes are kept rather than text, undo/redo write cells back in HH:MM form: '9:5' comes back as '09:05' and
+# text that isn't a time comes back as an empty cell.
+# When the buffer is full the oldest steps are dropped whole. A single step with more diffs than the buffer holds
+# can't be undone at all, so it clears the history rather than leaving part of the step undoable
+class CellUndoStack:
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.cells = np.zeros((capacity, 4), dtype=np.int32)    # Row, column, old minutes, new minutes
+        self.steps = np.zeros(capacity, dtype=np.int64)         # Step each diff belongs to
+
+        # Absolute positions, the physical slot is position % capacity
+        self.start = 0      # Oldest diff still stored
+        self.cursor = 0     # One past the last applied diff
+        self.end = 0        # One past the last redoable diff
+
+        self.step = 0
+        self.group_depth = 0
+        self.dropped_step = 0   # Step that overflowed the buffer, its remaining diffs aren't recorded
+
+    @contextmanager
+    def group(self):
+        if not self.group_depth:
+            self.step += 1
+        self.group_depth += 1
+
+        try:
+            yield
+        finally:
+            self.group_depth -= 1
+
+    def push(self, row, column, old, new):
+        if not self.group_depth:
+            self.step += 1
+        if self.step == self.dropped_step:
+            return
+
+        # A new edit discards anything that could have been redone
+        self.end = self.cursor
+
+        # Drop the oldest step entirely when the buffer is full so no step is left half undoable
+        if self.end - self.start == self.capacity:
+            oldest_step = self.steps[self.start % self.capacity]
+            if oldest_step == self.step:
+                self.dropped_step = self.step
+                self.clear()
+                return
+
+            while self.start < self.end and self.steps[self.start % self.capacity] == oldest_step:
+                self.start += 1
+
+        slot = self.end % self.capacity
+        self.cells[slot] = row, column, old, new
+        self.steps[slot] = self.step
+
+        self.end += 1
+        self.cursor = self.end
+
+    def can_undo(self):
+        return self.cursor > self.start
+
+    def can_redo(self):
+        return self.cursor < self.end
+
+    def clear(self):
+        self.start = self.cursor = self.end = 0
+
+    def _slots(self, first, last):
+        return np.arange(first, last) % self.capacity
+
+    # Returns (rows, columns, minutes) to write back into the table, empty if there is nothing to undo
+    def undo(self):
+        first = last = self.cursor
+        if self.can_undo():
+            step = self.steps[(last - 1) % self.capacity]
+            while first > self.start and self.steps[(first - 1) % self.capacity] == step:
+                first -= 1
+
+        self.cursor = first
+
+        # Apply in reverse so a cell edited several times in one step ends on its oldest value
+        cells = self.cells[self._slots(first, last)[::-1]]
+        return cells[:, 0], cells[:, 1], cells[:, 2]
+
+    def redo(self):
+        first = last = self.cursor
+        if self.can_redo():
+            step = self.steps[first % self.capacity]
+            while last < self.end and self.steps[last % self.capacity] == step:
+                last += 1
+
+        self.cursor = last
+
+        cells = self.cells[self._slots(first, last)]
+        return cells[:, 0], cells[:, 1], cells[:, 3]
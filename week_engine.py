@@ -0,0 +1,124 @@
+import re
+
+# Third party imports
+import numpy as np
+
+NO_TIME = -1    # Marker for an empty or unparseable cell
+MINUTES_REQUIRED = 2520
+WORKDAYS = 5    # Monday-Friday are the first rows of the table
+MINUTES_PER_DAY = 24 * 60
+
+# Same grammar datetime.strptime uses for '%H:%M' (one or two digit fields, full string must match)
+TIME_REGEX = re.compile(r'(2[0-3]|[0-1]\d|\d):([0-5]\d|\d)')
+
+
+def parse_minutes(text):
+    match = TIME_REGEX.fullmatch(text) if text else None
+    if not match:
+        return NO_TIME
+
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+# parse_minutes over a whole array of strings at once. ASCII cells are checked and converted by looking at their
+# characters as numbers; anything else (e.g. other scripts' digits, which the regex also accepts) goes through
+# parse_minutes
+def parse_minutes_array(texts):
+    texts = np.asarray(texts, dtype=str)
+    shape = texts.shape
+    texts = texts.ravel()
+    if not texts.size:
+        return np.full(shape, NO_TIME, dtype=np.int32)
+
+    lengths = np.char.str_len(texts)
+    codes = np.zeros((texts.size, 5), dtype=np.uint32)
+    short = lengths <= 5
+    fixed = texts[short].astype('U5')
+    codes[short] = np.frombuffer(fixed.tobytes(), dtype=np.uint32).reshape(-1, 5) if fixed.size else 0
+
+    digits = (codes >= ord('0')) & (codes <= ord('9'))
+    values = codes.astype(np.int32) - ord('0')
+    colon = codes == ord(':')
+
+    # H:M, H:MM, HH:M and HH:MM, the colon being at index 1 or 2
+    one_digit_hour = colon[:, 1] & digits[:, 0]
+    two_digit_hour = colon[:, 2] & digits[:, 0] & digits[:, 1]
+    minute_start = np.where(one_digit_hour, 2, 3)
+    minute_digits = lengths - minute_start
+
+    hours = np.where(one_digit_hour, values[:, 0], values[:, 0] * 10 + values[:, 1])
+    rows = np.arange(texts.size)
+    first = np.minimum(minute_start, 4)
+    second = np.minimum(minute_start + 1, 4)
+    minutes = np.where(minute_digits == 1, values[rows, first], values[rows, first] * 10 + values[rows, second])
+    two_minute_digits = (minute_digits == 2) & digits[rows, first] & digits[rows, second] & (values[rows, first] < 6)
+    minute_valid = np.where(minute_digits == 1, digits[rows, first], two_minute_digits)
+
+    valid = short & (one_digit_hour | two_digit_hour) & minute_valid & (hours < 24)
+    result = np.where(valid, hours * 60 + minutes, NO_TIME).astype(np.int32)
+
+    # Non-ASCII cells
+    for i in np.flatnonzero(~valid & (codes > 127).any(axis=1)):
+        result[i] = parse_minutes(str(texts[i]))
+
+    return result.reshape(shape)
+
+
+# Evaluate rows of [in, out, in, out, ...] minutes the same way the table always has:
+# pairs are read left to right and the first incomplete pair ends the row, only positive intervals count as work and
+# a row that ends early without any work counts as an unfinished day.
+# durations holds the length of each pair; by default it's the plain clock difference, which is negative (so dropped)
+# for shifts crossing midnight
+def day_totals(minutes, durations=None):
+    minutes = np.asarray(minutes)
+    minutes = minutes.reshape(-1, minutes.shape[-1])
+    ins = minutes[:, 0::2]
+    outs = minutes[:, 1::2]
+
+    valid = (ins != NO_TIME) & (outs != NO_TIME)
+    reached = np.cumprod(valid, axis=1).astype(bool)
+    difference = outs - ins if durations is None else np.asarray(durations).reshape(ins.shape)
+    counted = reached & (difference > 0)
+
+    worked = np.where(counted, difference, 0).sum(axis=1)
+    unfinished = ~valid.all(axis=1) & ~counted.any(axis=1)
+
+    return worked, unfinished
+
+
+# First In and last Out of each worked row (the Out of the last complete pair), NO_TIME for rows without work
+def day_bounds(minutes, worked):
+    minutes = np.asarray(minutes)
+    minutes = minutes.reshape(-1, minutes.shape[-1])
+    worked_days = worked > 0
+
+    valid = minutes != NO_TIME
+    first_pair = worked_days & valid[:, 0] & valid[:, 1]
+    second_pair = first_pair & valid[:, 2] & valid[:, 3]
+
+    start = np.where(worked_days, minutes[:, 0], NO_TIME)
+    end = np.where(second_pair, minutes[:, 3], np.where(first_pair, minutes[:, 1], NO_TIME))
+
+    return start, end
+
+
+def format_duration(minutes):
+    hours = int(abs(minutes) / 60)
+    remainder = int(abs(minutes) - 60 * hours)
+
+    # Flip sign only once if negative
+    sign = '-' if minutes < 0 else ''
+
+    return f'{sign}{hours}:{remainder:02d}'
+
+
+def week_labels(worked_minutes, unfinished_days, minutes_required=MINUTES_REQUIRED):
+    remaining_minutes = int(minutes_required) - int(worked_minutes)
+
+    try:
+        remaining_minutes_per_day = remaining_minutes / int(unfinished_days)
+    except ZeroDivisionError:
+        remaining_minutes_per_day = 0
+
+    return (f'Time left this week: {format_duration(remaining_minutes)}',
+            f'Time left per remaining weekday: {format_duration(remaining_minutes_per_day)}')
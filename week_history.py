@@ -0,0 +1,174 @@
+from collections.abc import Mapping
+import datetime
+import zlib
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from common import FileLock
+from common.qt import save_to_json_gz, load_from_json_gz
+from week_engine import NO_TIME
+
+DAYS_PER_WEEK = 7
+COLUMNS = 4
+
+
+def week_start_of(date):
+    return date - datetime.timedelta(days=date.weekday())
+
+
+def empty_week():
+    return np.full((DAYS_PER_WEEK, COLUMNS), NO_TIME, dtype=np.int32)
+
+
+def week_checksum(minutes):
+    return zlib.crc32(np.ascontiguousarray(minutes, dtype=np.int32).tobytes())
+
+
+# Per-cell merge of two copies of a week: each cell keeps whichever side was edited last (ties keep ours)
+def merge_cells(minutes, modified, other_minutes, other_modified):
+    newer = other_modified > modified
+    return np.where(newer, other_minutes, minutes), np.maximum(modified, other_modified)
+
+
+# The stored weeks as a read-only mapping of Monday -> minutes grid. Nothing is kept in memory: each lookup reads the
+# week's file (or takes its unsaved copy), so callers go through it once per week and keep what they derive instead
+class StoredWeeks(Mapping):
+    def __init__(self, history):
+        self.history = history
+
+    def __getitem__(self, week_start):
+        if week_start not in self.history.revisions:
+            raise KeyError(week_start)
+
+        return self.history.get_week(week_start)
+
+    def __contains__(self, week_start):
+        return week_start in self.history.revisions
+
+    def __iter__(self):
+        return iter(self.history.week_starts())
+
+    def __len__(self):
+        return len(self.history.revisions)
+
+
+# Stored punches, one file per week (named after the week's Monday) holding the table as a minutes grid along with
+# when each cell was last edited (epoch milliseconds), so concurrent writers can be merged cell by cell.
+# Only an index of the stored weeks is held, with a revision per week so caches can tell which weeks are stale; week
+# contents are read when asked for. Edits not stored yet (see set_week) are kept until the week is saved
+class WeekHistory:
+    def __init__(self, directory):
+        self.directory = directory / 'weeks'
+        self.weeks = StoredWeeks(self)
+        self.unsaved = {}       # Week start -> (minutes, modified) set in memory only
+        self.checksums = {}     # Week start -> crc32 of the minutes last seen, None until the file is read
+        self.revision = 0
+        self.revisions = {}
+        self.warnings = []      # Files that were skipped, for the GUI to show (see WeeklyTimeTracker.show_warnings)
+
+    # Index the week files without reading them
+    def load(self):
+        self.unsaved = {}
+        self.checksums = {}
+        self.revisions = {}
+        if not self.directory.exists():
+            return self
+
+        for path in self.directory.glob('*.gz'):
+            try:
+                week_start = datetime.date.fromisoformat(path.stem)
+            except ValueError:
+                self.warnings.append(f'Skipping week file {path.name}: not named after a date')
+                continue
+            self.checksums[week_start] = None
+            self.revision += 1
+            self.revisions[week_start] = self.revision
+
+        return self
+
+    def week_starts(self):
+        return sorted(self.revisions)
+
+    def file_name(self, week_start):
+        return f'{week_start.isoformat()}.gz'
+
+    def read_week(self, week_start):
+        settings = load_from_json_gz(self.directory, self.file_name(week_start))
+        if not settings:
+            return empty_week(), np.zeros((DAYS_PER_WEEK, COLUMNS), dtype=np.int64)
+
+        minutes = np.asarray(settings['minutes'], dtype=np.int32)
+
+        # Weeks stored before edit times were tracked lose any merge against a timed edit
+        modified = np.asarray(settings.get('modified', np.zeros(minutes.shape)), dtype=np.int64)
+
+        return minutes, modified
+
+    # New revision for a week whose minutes differ from the ones last seen
+    def update_revision(self, week_start, minutes):
+        checksum = week_checksum(minutes)
+        if self.checksums.get(week_start, -1) != checksum:
+            self.checksums[week_start] = checksum
+            self.revision += 1
+            self.revisions[week_start] = self.revision
+
+    # Update a week in memory only, e.g. edits in the table that reports should already see
+    def set_week(self, week_start, minutes, modified=None):
+        minutes = np.array(minutes, dtype=np.int32)
+        modified = np.zeros(minutes.shape, dtype=np.int64) if modified is None else np.array(modified, dtype=np.int64)
+        self.unsaved[week_start] = (minutes, modified)
+        self.update_revision(week_start, minutes)
+
+        return minutes
+
+    # Merge with whatever another writer stored for this week and write the result atomically. Only this week's file
+    # is locked, and only for the read-merge-write. Returns the merged (minutes, modified)
+    def save_week(self, week_start, minutes, modified):
+        minutes, modified = self.write_week(week_start, minutes, modified)
+        self.week_saved(week_start, minutes, modified)
+
+        return minutes, modified
+
+    # The file part of save_week. It leaves the index alone, so it can run on another thread as long as week_saved
+    # is called with its result on the thread that owns the history
+    def write_week(self, week_start, minutes, modified):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file_name = self.file_name(week_start)
+
+        with FileLock(self.directory / file_name):
+            minutes, modified = merge_cells(np.asarray(minutes, dtype=np.int32), np.asarray(modified, dtype=np.int64),
+                                            *self.read_week(week_start))
+            save_to_json_gz({'week_start': week_start.isoformat(), 'minutes': minutes, 'modified': modified},
+                            self.directory, file_name)
+
+        return minutes, modified
+
+    # Record a stored week. Unsaved edits newer than what was written (made while it was being written) stay
+    def week_saved(self, week_start, minutes, modified):
+        unsaved = self.unsaved.get(week_start)
+        if unsaved and np.any(unsaved[1] > modified):
+            self.unsaved[week_start] = merge_cells(minutes, modified, *unsaved)
+            self.update_revision(week_start, self.unsaved[week_start][0])
+            return
+
+        self.unsaved.pop(week_start, None)
+        self.update_revision(week_start, minutes)
+
+    # A week's minutes, from memory if it has unsaved edits. A file that can't be read counts as an empty week
+    def get_week(self, week_start):
+        if week_start in self.unsaved:
+            return self.unsaved[week_start][0]
+
+        try:
+            minutes, _ = self.read_week(week_start)
+        except (ValueError, KeyError, OSError) as e:
+            self.warnings.append(f'Skipping week file {self.file_name(week_start)}: {e}')
+            return empty_week()
+
+        # What was indexed is now known, without a new revision since nothing changed
+        if self.checksums.get(week_start, -1) is None:
+            self.checksums[week_start] = week_checksum(minutes)
+
+        return minutes
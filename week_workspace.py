@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from undo_stack import CellUndoStack
+from week_history import DAYS_PER_WEEK, merge_cells
+
+RESIDENT_WEEKS = 8
+
+
+# Everything the table edits for one week. The main window works on these arrays directly while the week is shown.
+# Every edit stamps the cell's modified time, so a week differs from what was last read or stored exactly when its
+# modified times do
+class WeekModel:
+    __slots__ = ('week_start', 'minutes', 'modified', 'undo_stack', 'stored_modified')
+
+    def __init__(self, week_start, minutes, modified, undo_stack=None):
+        self.week_start = week_start
+        self.minutes = minutes
+        self.modified = modified
+        self.undo_stack = undo_stack or CellUndoStack()
+        self.stored_modified = modified.copy()
+
+    def is_dirty(self):
+        return not np.array_equal(self.modified, self.stored_modified)
+
+    def mark_stored(self):
+        self.stored_modified = self.modified.copy()
+
+
+# The weeks open in the table, at most `capacity` of them in memory. The least recently shown week is written back to
+# the history and dropped when another has to be loaded; the weeks either side of the one shown are read from disk on a
+# background thread so moving to them doesn't wait on the file
+class WeekWorkspace:
+    def __init__(self, history, capacity=RESIDENT_WEEKS):
+        self.history = history
+        self.capacity = capacity
+        self.models = OrderedDict()     # Week start -> WeekModel, least recently used first
+        self.prefetched = {}            # Week start -> Future of read_week
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __contains__(self, week_start):
+        return week_start in self.models
+
+    # Resident weeks in date order
+    def week_starts(self):
+        return sorted(self.models)
+
+    # Put a model for week_start in front, taking over the table's arrays if given (for the week shown at startup)
+    def open(self, week_start, minutes=None, modified=None, undo_stack=None):
+        model = self.models.get(week_start)
+        if model is None:
+            table = minutes is not None
+            if not table:
+                minutes, modified = self.read(week_start)
+            model = WeekModel(week_start, minutes, modified, undo_stack)
+            self.models[week_start] = model
+
+            # The table may hold edits that were never stored
+            if table:
+                model.stored_modified[:] = 0
+
+        self.models.move_to_end(week_start)
+        self.evict()
+        self.prefetch(week_start)
+
+        return model
+
+    # A week is only dropped once it's stored; if that fails it stays resident, edits and undo history intact
+    def close(self, week_start):
+        model = self.models.get(week_start)
+        if model:
+            self.store(model)
+            del self.models[week_start]
+
+    def evict(self):
+        while len(self.models) > self.capacity:
+            week_start, model = next(iter(self.models.items()))
+            self.store(model)
+            del self.models[week_start]
+
+    # What's stored for a week, merged cell by cell with anything newer only kept in memory so far
+    def read(self, week_start):
+        future = self.prefetched.pop(week_start, None)
+        minutes, modified = future.result() if future else self.history.read_week(week_start)
+
+        if week_start in self.history.unsaved:
+            minutes, modified = merge_cells(*self.history.unsaved[week_start], minutes, modified)
+
+        return np.array(minutes, dtype=np.int32), np.array(modified, dtype=np.int64)
+
+    def prefetch(self, week_start):
+        adjacent = {week_start + datetime.timedelta(days=offset) for offset in (-DAYS_PER_WEEK, DAYS_PER_WEEK)}
+
+        # Forget reads for weeks no longer next to the one shown so the prefetched set stays bounded
+        for stale in self.prefetched.keys() - adjacent:
+            self.prefetched.pop(stale).cancel()
+
+        for week in adjacent - self.models.keys() - self.prefetched.keys():
+            self.prefetched[week] = self.executor.submit(self.history.read_week, week)
+
+    # Write one week back if it changed, merging with other writers; the model takes the merged result so it stays
+    # current
+    def store(self, model):
+        if not model.is_dirty():
+            return
+
+        self.week_stored(model.week_start, *self.history.save_week(model.week_start, model.minutes, model.modified))
+
+    # Store every changed resident week except skip (the one the caller saves and merges itself)
+    def store_all(self, skip=None):
+        for week_start, model in self.models.items():
+            if week_start != skip:
+                self.store(model)
+
+    # Copies of the changed resident weeks except skip, as (week_start, minutes, modified), for storing them on
+    # another thread; the results go back through history.week_saved and week_stored
+    def dirty_weeks(self, skip=None):
+        return [(week_start, model.minutes.copy(), model.modified.copy()) for week_start, model in self.models.items()
+                if week_start != skip and model.is_dirty()]
+
+    # A week was stored as (minutes, modified). A resident model keeps cells edited since, which leaves it dirty
+    def week_stored(self, week_start, minutes, modified):
+        model = self.models.get(week_start)
+        if model:
+            model.minutes[:], model.modified[:] = merge_cells(model.minutes, model.modified, minutes, modified)
+            model.stored_modified = np.array(modified, dtype=np.int64)
+
+    # Edit cells of a week that isn't shown: a resident week records them as one undo step, any other week is read,
+    # changed and stored straight away. Returns the week's minutes afterwards
+    def update_cells(self, week_start, rows, columns, minutes, modified):
+        model = self.models.get(week_start)
+        if model is None:
+            week_minutes, week_modified = self.read(week_start)
+            week_minutes[rows, columns] = minutes
+            week_modified[rows, columns] = modified
+            return self.history.save_week(week_start, week_minutes, week_modified)[0]
+
+        with model.undo_stack.group():
+            for row, column, value in zip(rows.tolist(), columns.tolist(), minutes.tolist()):
+                model.undo_stack.push(row, column, model.minutes[row, column], value)
+        model.minutes[rows, columns] = minutes
+        model.modified[rows, columns] = modified
+
+        return model.minutes
+
+    # Take cells stored elsewhere that are newer than a resident week's own
+    def merge(self, week_start, minutes, modified):
+        model = self.models.get(week_start)
+        if model:
+            # Cells taken from elsewhere are already stored, so they don't make the week dirty
+            dirty = model.is_dirty()
+            model.minutes[:], model.modified[:] = merge_cells(model.minutes, model.modified, minutes, modified)
+            if not dirty:
+                model.mark_stored()
+
+    # Copy the resident weeks with unsaved edits into the history's memory so reports and queries see them; the
+    # history drops its copy once the week is saved
+    def sync(self):
+        for week_start, model in self.models.items():
+            if model.is_dirty():
+                self.history.set_week(week_start, model.minutes, model.modified)
+
+    def shutdown(self):
+        for future in self.prefetched.values():
+            future.cancel()
+        self.prefetched = {}
+        self.executor.shutdown(wait=False)
+
@@ -1,16 +1,38 @@
+import datetime
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from PyQt5.QtCore import pyqtSignal, QObject, QTimer
 from PyQt5.QtWidgets import QApplication, QMessageBox, QFileDialog
 
 from common import get_config_path
-from common.qt import display_message, set_widget_value, load_from_json_gz, save_to_json_gz, get_widget_info
+from common.qt import display_message, set_widget_value, load_from_json_gz, save_to_json_gz, get_table_snapshot, \
+    read_summary
+from flex_ledger import FlexLedger
 from main_window import MainWindow
+from plugin_registry import PluginRegistry
+from punch_ipc import COMMANDS, PunchServer, send_command, print_reply
+from reports import ReportCache
+from punch_query import PunchIndex
+from reports_dialog import ReportsDialog, QueryResultsDialog
+from week_engine import NO_TIME
+from week_history import WeekHistory
+from week_workspace import WeekWorkspace
+from work_rules import RULES_FILE_NAME, CompiledRules
 
 APP_PUBLISHER = 'Mike Projects'
 APP_NAME = 'TimeToWork'
 
 CONFIG_DIRECTORY = get_config_path(APP_PUBLISHER, APP_NAME)
 GUI_SETTINGS_AUTOSAVE_FILE_NAME = 'gui_settings_autosave.gz'
+AUTOSAVE_INTERVAL_MS = 5 * 60 * 1000
+STATUS_MESSAGE_MS = 30 * 1000
+
+
+# Carries background autosave results to the GUI thread
+class SaveSignals(QObject):
+    finished = pyqtSignal(list, list)
 
 
 class WeeklyTimeTracker:
@@ -24,28 +46,246 @@ class WeeklyTimeTracker:
 
         self.main_window.ui.actionSave.triggered.connect(self.manual_save_settings)
         self.main_window.ui.actionLoad.triggered.connect(self.manual_load_settings)
+        self.main_window.ui.actionImport.triggered.connect(self.import_weeks)
+        self.main_window.ui.actionExport.triggered.connect(self.export_weeks)
+        self.main_window.ui.actionReports.triggered.connect(self.show_reports)
+        self.main_window.ui.query_edit.returnPressed.connect(self.run_query)
+
+        # Through a lambda, so destroyed's object argument isn't taken for save_settings' background flag
+        self.main_window.destroyed.connect(lambda: self.save_settings())
+
+        # Paint the totals saved with the last session before anything else is loaded
+        summary = read_summary(CONFIG_DIRECTORY, 'time_tracker_auto_save.gz')
+        if summary:
+            self.main_window.show_summary(summary)
+            self.main_window.show()
+            self.app.processEvents()
+
+        # Import/export formats and rule sets, imported only once they're used
+        self.plugins = PluginRegistry(CONFIG_DIRECTORY).discover()
+        self.main_window.ui.actionImport.setEnabled(bool(self.plugins.names('importers')))
+        self.main_window.ui.actionExport.setEnabled(bool(self.plugins.names('exporters')))
+
+        # Daily targets, holidays and break rules from work_rules.json and holiday files (defaults to 42h over
+        # Monday-Friday, also used when the rules can't be read)
+        try:
+            self.rules = CompiledRules.load(CONFIG_DIRECTORY, self.plugins)
+        except (OSError, ValueError) as e:
+            display_message(QMessageBox.Warning, 'Work rules', f'Could not load {RULES_FILE_NAME}, using the default '
+                                                               f'rules instead: {e}')
+            self.rules = CompiledRules({})
+        self.main_window.set_rules(self.rules)
 
-        self.main_window.destroyed.connect(self.save_settings)
         self.load_settings()
 
-    def get_settings(self):
+        # The table is loaded now, the labels come from the full recompute
+        if summary and summary != self.main_window.get_summary():
+            self.main_window.ui.statusbar.showMessage('The totals saved with the last session did not match the '
+                                                      'loaded week, showing the recomputed totals', STATUS_MESSAGE_MS)
+
+        # Stored weeks feed the flex balance shown under the weekly totals. Only an index of them is kept, weeks are
+        # read when needed and reports and searches cache what they derive from them
+        self.history = WeekHistory(CONFIG_DIRECTORY).load()
+
+        # Previous/next weeks open in tabs, a bounded number kept in memory
+        self.workspace = WeekWorkspace(self.history)
+        self.main_window.set_workspace(self.workspace)
+        self.main_window.destroyed.connect(self.workspace.shutdown)
+        self.main_window.set_ledger(FlexLedger.from_history(self.history, self.rules))
+        self.show_warnings(self.plugins, self.rules, self.history)
+        self.report_cache = ReportCache(self.history, self.rules)
+        self.punch_index = PunchIndex(self.history, self.rules)
+
+        # Accept commands from later launches and scripts (see punch_ipc)
+        self.punch_server = PunchServer({
+            'show': self.show_main_window,
+            'punch_in': self.main_window.punch,
+            'punch_out': lambda: self.main_window.punch(punch_out=True),
+            'remaining': self.get_remaining,
+        })
+        if not self.punch_server.listen():
+            self.main_window.ui.statusbar.showMessage('Could not start the command server, other launches will open '
+                                                      f'a second window: {self.punch_server.server.errorString()}',
+                                                      STATUS_MESSAGE_MS)
+
+        # Periodic autosave, which also picks up edits other writers made to this week. Encoding, compressing and
+        # writing the settings file and the changed weeks happens on a background thread
+        self.save_executor = ThreadPoolExecutor(max_workers=1)
+        self.save_signals = SaveSignals()
+        self.save_signals.finished.connect(self.autosave_finished)
+        self.pending_save = None
+        self.autosave_timer = QTimer(self.main_window)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start(AUTOSAVE_INTERVAL_MS)
+
+    def show_main_window(self):
+        self.main_window.showNormal()
+        self.main_window.raise_()
+        self.main_window.activateWindow()
+        return 'shown'
+
+    # Problems the non-GUI modules collected (files they skipped), shown in the status bar after any message that's
+    # still showing
+    def show_warnings(self, *sources):
+        warnings = []
+        for source in sources:
+            warnings += source.warnings
+            source.warnings.clear()
+
+        if warnings:
+            statusbar = self.main_window.ui.statusbar
+            if statusbar.currentMessage():
+                warnings.insert(0, statusbar.currentMessage())
+            statusbar.showMessage('; '.join(warnings), STATUS_MESSAGE_MS)
+
+    def get_remaining(self):
         ui = self.main_window.ui
-        main_window_widgets = {
-            ui.time_entry_table
+        return {
+            'time_left': ui.time_left_label.text(),
+            'time_left_per_day': ui.time_left_per_day_label.text(),
+            'flex_balance': ui.flex_balance_label.text(),
+            'working_days_left_this_week': self.main_window.calendar.remaining_in_week(datetime.date.today()),
+            'working_days_left_this_month': self.main_window.calendar.remaining_in_month(datetime.date.today()),
         }
 
+    # Everything here is a copy, so the settings can be written from another thread while the table is edited
+    def get_settings(self):
         return {
-            'main_window': [get_widget_info(w) for w in main_window_widgets],
+            'week_start': self.main_window.week_start.isoformat(),
+            'modified': self.main_window.modified.copy(),
+            'table_snapshot': get_table_snapshot(self.main_window.ui.time_entry_table),
         }
 
+    def show_reports(self):
+        # Include the weeks being edited; only weeks that changed since the last report are recomputed
+        self.workspace.sync()
+        ReportsDialog(self.report_cache.report(), self.main_window).show()
+        self.show_warnings(self.history)
+
+    def run_query(self):
+        query = self.main_window.ui.query_edit.text()
+        if not query:
+            return
+
+        try:
+            self.workspace.sync()
+            QueryResultsDialog(query, self.punch_index.query(query), self.main_window).show()
+        except ValueError as e:
+            display_message(QMessageBox.Warning, 'Search', str(e))
+        self.show_warnings(self.history)
+
+    # File dialog filter listing the plugins of a kind, and the plugin name picked from it
+    def plugin_filters(self, kind):
+        filters = {}
+        for plugin in self.plugins.plugins(kind):
+            extensions = ' '.join(f'*.{extension}' for extension in plugin.get('extensions', ['*']))
+            filters[f'{plugin["name"]} ({extensions})'] = plugin['name']
+
+        return filters
+
+    def import_weeks(self):
+        filters = self.plugin_filters('importers')
+        path, selected = QFileDialog.getOpenFileName(self.main_window, 'Import', '', ';;'.join(filters))
+        if not path:
+            return
+
+        # Plugins can fail in any way on a malformed file, and an exception escaping this slot would end the app
+        try:
+            weeks = self.plugins.get('importers', filters[selected])().read(path)
+        except Exception as e:
+            display_message(QMessageBox.Warning, 'Import', f'Could not import {path}: {e}')
+            return
+
+        try:
+            # Imported punches count as edited now, empty cells leave what's stored alone
+            now = int(time.time() * 1000)
+            for week_start, minutes in weeks.items():
+                minutes, modified = self.history.save_week(week_start, minutes, (minutes != NO_TIME) * now)
+                if week_start == self.main_window.week_start:
+                    self.main_window.merge_cells(minutes, modified)
+                else:
+                    self.workspace.merge(week_start, minutes, modified)
+        except (OSError, ValueError, TimeoutError) as e:
+            display_message(QMessageBox.Warning, 'Import', f'Could not import {path}: {e}')
+            return
+
+        self.main_window.set_ledger(FlexLedger.from_history(self.history, self.rules))
+        self.show_warnings(self.history)
+        display_message(QMessageBox.Information, 'Import', f'Imported {len(weeks)} week(s)')
+
+    def export_weeks(self):
+        filters = self.plugin_filters('exporters')
+        path, selected = QFileDialog.getSaveFileName(self.main_window, 'Export', '', ';;'.join(filters))
+        if not path:
+            return
+
+        try:
+            self.workspace.sync()
+            self.plugins.get('exporters', filters[selected])().write(path, self.history.weeks)
+        except Exception as e:
+            display_message(QMessageBox.Warning, 'Export', f'Could not export {path}: {e}')
+        self.show_warnings(self.history)
+
     def manual_save_settings(self):
         path, type = QFileDialog.getSaveFileName()
         file_name = path.split('/')[-1]
-        save_to_json_gz(self.get_settings(), CONFIG_DIRECTORY, file_name)
+        save_to_json_gz(self.get_settings(), CONFIG_DIRECTORY, file_name, summary=self.main_window.get_summary())
 
-    def save_settings(self):
+    # Save the table and store the changed weeks. In the background only copies are written, the merged weeks come
+    # back through autosave_finished; on exit everything is written before returning
+    def save_settings(self, background=False):
         file_name = 'time_tracker_auto_save.gz'
-        save_to_json_gz(self.get_settings(), CONFIG_DIRECTORY, file_name)
+        week_start = self.main_window.week_start
+        if background:
+            # The week shown is always stored so edits other writers made to it are picked up
+            weeks = [(week_start, self.main_window.minutes.copy(), self.main_window.modified.copy())]
+            weeks += self.workspace.dirty_weeks(skip=week_start)
+            self.pending_save = self.save_executor.submit(self.write_autosave, self.get_settings(),
+                                                          self.main_window.get_summary(), file_name, weeks)
+            return
+
+        # Let a pending background save finish first so it can't land after this one
+        if self.pending_save:
+            self.pending_save.result()
+        save_to_json_gz(self.get_settings(), CONFIG_DIRECTORY, file_name, summary=self.main_window.get_summary())
+        self.history.save_week(week_start, self.main_window.minutes, self.main_window.modified)
+        self.workspace.store_all(skip=week_start)
+
+    # Runs on save_executor: only files are touched here, the results are handed to the GUI thread
+    def write_autosave(self, settings, summary, file_name, weeks):
+        saved = []
+        errors = []
+        try:
+            save_to_json_gz(settings, CONFIG_DIRECTORY, file_name, summary=summary)
+        except OSError as e:
+            errors.append(str(e))
+
+        for week_start, minutes, modified in weeks:
+            try:
+                saved.append((week_start, *self.history.write_week(week_start, minutes, modified)))
+            except (OSError, TimeoutError, ValueError, KeyError) as e:
+                errors.append(f'week of {week_start:%d %b %Y}: {e}')
+
+        self.save_signals.finished.emit(saved, errors)
+
+    # Take the stored weeks back into the history index, the table and the workspace. Cells edited while the save
+    # was running are newer than what was written, so they are kept and still count as unsaved
+    def autosave_finished(self, saved, errors):
+        for week_start, minutes, modified in saved:
+            self.history.week_saved(week_start, minutes, modified)
+            if week_start == self.main_window.week_start:
+                self.main_window.merge_cells(minutes, modified)
+            self.workspace.week_stored(week_start, minutes, modified)
+
+        if errors:
+            self.main_window.ui.statusbar.showMessage(f'Autosave failed: {"; ".join(errors)}', STATUS_MESSAGE_MS)
+
+    def autosave(self):
+        # A save that is still running will be followed by the next one
+        if self.pending_save and not self.pending_save.done():
+            return
+
+        self.save_settings(background=True)
 
     def manual_load_settings(self):
         path, type = QFileDialog.getOpenFileName()
@@ -65,20 +305,53 @@ class WeeklyTimeTracker:
             else:
                 return
 
-            # Set widget values for each window
-            central_widget = self.main_window.ui.centralwidget
-            for widget_info in settings['main_window']:
-                set_widget_value(central_widget, widget_info)
+            # Settings saved before weeks were tracked belong to the current week
+            if 'week_start' in settings:
+                self.main_window.show_week(datetime.date.fromisoformat(settings['week_start']))
+
+            # Restore the table as a single undo step, from the model snapshot or, in files saved before snapshots,
+            # the per-widget values
+            if 'table_snapshot' in settings:
+                self.main_window.restore_table(settings['table_snapshot'])
+            else:
+                central_widget = self.main_window.ui.centralwidget
+                with self.main_window.undo_stack.group():
+                    for widget_info in settings['main_window']:
+                        set_widget_value(central_widget, widget_info)
+                self.main_window.update_undo_actions()
+
+            # Keep the original edit times rather than the time the file was loaded
+            if 'modified' in settings:
+                self.main_window.modified[:] = settings['modified']
 
         except Exception as e:
             display_message(QMessageBox.Critical, 'Error', f'Invalid settings file: {e}')
 
 
+# If an instance is already running, hand it the command (show by default) instead of starting a second one
+command = sys.argv[1] if len(sys.argv) > 1 else 'show'
+if command not in COMMANDS:
+    print(f'Usage: weekly_time_tracker.py [{"|".join(COMMANDS)}]', file=sys.stderr)
+    sys.exit(2)
+
+reply = send_command(command)
+if reply is not None:
+    print_reply(reply)
+    sys.exit(0 if reply['ok'] else 1)
+
 # Create instance of main control class
 instance = WeeklyTimeTracker()
 
 # Start by showing the main window
 instance.main_window.show()
 
+# With no instance to hand it to, this one carries out the command once it's up
+if command != 'show':
+    reply = instance.punch_server.run(command)
+    print_reply(reply)
+    if not reply['ok']:
+        instance.main_window.ui.statusbar.showMessage(f'Could not {command.replace("_", " ")}: {reply["error"]}',
+                                                      STATUS_MESSAGE_MS)
+
 # Execute and close on end on program exit
 sys.exit(instance.app.exec())
@@ -7,7 +7,7 @@ block_cipher = None
 a = Analysis(['weekly_time_tracker.py'],
              pathex=['C:\\Users\\ESDEMC Admin\\Documents\\PycharmProjects\\TimeToWork'],
              binaries=[],
-             datas=[],
+             datas=[('plugins', 'plugins')],
              hiddenimports=[],
              hookspath=[],
              runtime_hooks=[],
@@ -0,0 +1,112 @@
+import calendar
+import datetime
+
+# Third party imports
+import numpy as np
+
+HOLIDAYS_DIRECTORY = 'holidays'
+
+
+# Dates covered by the VEVENTs of an iCalendar file (all-day events, DTEND is exclusive)
+def parse_ics(text):
+    dates = []
+    start = end = None
+    for line in text.splitlines():
+        name, _, value = line.strip().partition(':')
+        name = name.split(';')[0].upper()
+
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            start = end = None
+        elif name == 'DTSTART':
+            start = datetime.datetime.strptime(value[:8], '%Y%m%d').date()
+        elif name == 'DTEND':
+            end = datetime.datetime.strptime(value[:8], '%Y%m%d').date()
+        elif name == 'END' and value.upper() == 'VEVENT' and start:
+            num_days = max((end - start).days, 1) if end else 1
+            dates.extend(start + datetime.timedelta(days=i) for i in range(num_days))
+
+    return dates
+
+
+# One YYYY-MM-DD date per line, '#' starts a comment
+def parse_holiday_list(text):
+    dates = []
+    for line in text.splitlines():
+        line = line.split('#')[0].strip()
+        if line:
+            dates.append(datetime.date.fromisoformat(line))
+
+    return dates
+
+
+# Files that can't be parsed are skipped and described in warnings, if given
+def load_holidays(directory, warnings=None):
+    directory = directory / HOLIDAYS_DIRECTORY
+    if not directory.exists():
+        return []
+
+    dates = []
+    for path in sorted(directory.iterdir()):
+        try:
+            if path.suffix.lower() == '.ics':
+                dates += parse_ics(path.read_text(encoding='utf-8'))
+            elif path.suffix.lower() in ('.txt', '.csv'):
+                dates += parse_holiday_list(path.read_text(encoding='utf-8'))
+        except (ValueError, OSError) as e:
+            if warnings is not None:
+                warnings.append(f'Skipping holiday file {path.name}: {e}')
+
+    return dates
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+# Working days (days the rules require any work on) as one bitset per year, bit i being day i of the year.
+# Counting working days over a range is then a shift, a mask and a popcount per year touched
+class WorkCalendar:
+    def __init__(self, rules):
+        self.rules = rules
+        self.years = {}
+
+        self.year_bits(datetime.date.today().year)
+
+    def year_bits(self, year):
+        bits = self.years.get(year)
+        if bits is None:
+            num_days = 366 if calendar.isleap(year) else 365
+            working = self.rules.daily_requirements(datetime.date(year, 1, 1), num_days) > 0
+            bits = int.from_bytes(np.packbits(working, bitorder='little').tobytes(), 'little')
+            self.years[year] = bits
+
+        return bits
+
+    # Number of working days in [start, end)
+    def count(self, start, end):
+        total = 0
+        while start < end:
+            year_end = datetime.date(start.year + 1, 1, 1)
+            stop = min(end, year_end)
+
+            first = start.timetuple().tm_yday - 1
+            num_days = (stop - start).days
+            total += popcount((self.year_bits(start.year) >> first) & ((1 << num_days) - 1))
+
+            start = stop
+
+        return total
+
+    def is_working(self, date):
+        return bool(self.year_bits(date.year) >> (date.timetuple().tm_yday - 1) & 1)
+
+    def working_mask(self, first_day, num_days):
+        return np.array([self.is_working(first_day + datetime.timedelta(days=i)) for i in range(num_days)])
+
+    # Working days left from date (inclusive) to the end of its week/month
+    def remaining_in_week(self, date):
+        return self.count(date, date + datetime.timedelta(days=7 - date.weekday()))
+
+    def remaining_in_month(self, date):
+        last_day = calendar.monthrange(date.year, date.month)[1]
+        return self.count(date, datetime.date(date.year, date.month, last_day) + datetime.timedelta(days=1))
@@ -0,0 +1,153 @@
+import datetime
+import json
+
+# Third party imports
+import numpy as np
+
+# Local imports
+from week_engine import NO_TIME, MINUTES_REQUIRED, WORKDAYS, parse_minutes
+from work_calendar import load_holidays
+
+RULES_FILE_NAME = 'work_rules.json'
+
+# Same targets the tracker has always used: 42h over Monday-Friday, no automatic breaks
+DEFAULT_RULES = {
+    'weekday_minutes': [MINUTES_REQUIRED // WORKDAYS] * WORKDAYS + [0, 0],
+    'schedules': [],    # [{'start': 'YYYY-MM-DD', 'weekday_minutes': [7 values]}], e.g. switching to part-time
+    'holidays': [],     # ['YYYY-MM-DD', ...], nothing is required on these days
+    'breaks': [],       # [{'after_minutes': 360, 'break_minutes': 30}], minimum break once a day passes a threshold
+    'max_day_minutes': 600,     # Most minutes (after breaks) the leave planner puts on one day
+    'earliest_start': '06:00',  # Window the leave planner schedules work in
+    'latest_end': '20:00',
+}
+
+
+def _check_weekday_minutes(values, name):
+    if not isinstance(values, list) or len(values) != 7 or \
+            not all(isinstance(value, int) and value >= 0 for value in values):
+        raise ValueError(f'{name} must be a list of 7 whole minutes, Monday to Sunday')
+
+
+def _check_date(value, name):
+    if isinstance(value, datetime.date):
+        return
+    try:
+        datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} {value!r} is not a YYYY-MM-DD date') from None
+
+
+# Rules as read from work_rules.json or a rule set plugin, checked before anything is compiled so a mistake in the
+# file is reported rather than failing somewhere later. Raises ValueError
+def check_rules(rules):
+    _check_weekday_minutes(rules['weekday_minutes'], 'weekday_minutes')
+
+    for schedule in rules['schedules']:
+        if not isinstance(schedule, dict) or 'start' not in schedule or 'weekday_minutes' not in schedule:
+            raise ValueError('Each schedule needs a start and weekday_minutes')
+        _check_date(schedule['start'], 'Schedule start')
+        _check_weekday_minutes(schedule['weekday_minutes'], f'weekday_minutes of the schedule from {schedule["start"]}')
+
+    for date in rules['holidays']:
+        _check_date(date, 'Holiday')
+
+    for rule in rules['breaks']:
+        if not isinstance(rule, dict) or not all(isinstance(rule.get(key), int) and rule[key] >= 0
+                                                 for key in ('after_minutes', 'break_minutes')):
+            raise ValueError('Each break needs whole after_minutes and break_minutes')
+
+    if not isinstance(rules['max_day_minutes'], int) or rules['max_day_minutes'] <= 0:
+        raise ValueError('max_day_minutes must be a positive whole number of minutes')
+
+    for name in ('earliest_start', 'latest_end'):
+        if not isinstance(rules[name], str) or parse_minutes(rules[name]) == NO_TIME:
+            raise ValueError(f'{name} must be an HH:MM time')
+
+
+def to_day_numbers(dates):
+    return np.array([np.datetime64(date, 'D') for date in dates], dtype='datetime64[D]')
+
+
+# Work rules compiled into arrays once, so requirements and break deductions for any span of days are a few
+# vectorized lookups instead of per-day Python logic
+class CompiledRules:
+    def __init__(self, rules):
+        rules = {**DEFAULT_RULES, **rules}
+        check_rules(rules)
+        self.warnings = []      # Problems load skipped over, for the GUI to show
+
+        # Schedule periods sorted by start; the base weekday targets apply before the first one
+        schedules = sorted(rules['schedules'], key=lambda schedule: schedule['start'])
+        self.schedule_starts = to_day_numbers([schedule['start'] for schedule in schedules])
+        self.schedule_minutes = np.array([rules['weekday_minutes']] +
+                                         [schedule['weekday_minutes'] for schedule in schedules], dtype=np.int64)
+
+        self.holidays = np.unique(to_day_numbers(rules['holidays']))
+
+        breaks = sorted(rules['breaks'], key=lambda rule: rule['after_minutes'])
+        self.break_thresholds = np.array([rule['after_minutes'] for rule in breaks], dtype=np.int64)
+        self.break_minutes = np.array([rule['break_minutes'] for rule in breaks], dtype=np.int64)
+
+        self.max_day_minutes = int(rules['max_day_minutes'])
+        self.earliest_start = parse_minutes(rules['earliest_start'])
+        self.latest_end = parse_minutes(rules['latest_end'])
+
+    # Rules from work_rules.json plus any holiday files (see work_calendar.load_holidays). A 'rule_set' entry names a
+    # rule set plugin whose rules apply underneath the ones in the file. Raises ValueError if the rules aren't valid
+    @classmethod
+    def load(cls, directory, plugins=None):
+        rules = {}
+
+        path = directory / RULES_FILE_NAME
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+            if not isinstance(rules, dict):
+                raise ValueError(f'{RULES_FILE_NAME} must hold a JSON object')
+
+        warnings = []
+        if plugins and 'rule_set' in rules:
+            try:
+                rules = {**plugins.get('rule_sets', rules['rule_set'])().rules(), **rules}
+            except Exception as e:
+                # A plugin can fail in any way, the rules in the file still apply
+                warnings.append(f'Ignoring rule set {rules["rule_set"]!r}: {e}')
+
+        rules['holidays'] = rules.get('holidays', []) + load_holidays(directory, warnings)
+
+        compiled = cls(rules)
+        compiled.warnings = warnings
+
+        return compiled
+
+    def day_numbers(self, first_day, num_days):
+        return np.datetime64(first_day, 'D') + np.arange(num_days)
+
+    # Required minutes for each of num_days days starting at first_day
+    def daily_requirements(self, first_day, num_days):
+        days = self.day_numbers(first_day, num_days)
+
+        # 1970-01-01 was a Thursday, shift so Monday is 0
+        weekdays = (days.astype(np.int64) + 3) % 7
+        periods = np.searchsorted(self.schedule_starts, days, side='right')
+
+        requirements = self.schedule_minutes[periods, weekdays]
+        requirements[np.isin(days, self.holidays)] = 0
+
+        return requirements
+
+    # Worked minutes after automatic breaks: once a day passes a threshold, whatever is missing from the minimum
+    # break (beyond the gap already left between the two pairs) is deducted
+    def apply_breaks(self, worked, minutes):
+        if not self.break_thresholds.size:
+            return worked
+
+        minutes = np.asarray(minutes)
+        minutes = minutes.reshape(-1, minutes.shape[-1])
+        recorded = np.where((minutes[:, 1] != NO_TIME) & (minutes[:, 2] != NO_TIME) & (minutes[:, 3] != NO_TIME),
+                            np.maximum(minutes[:, 2] - minutes[:, 1], 0), 0)
+
+        rule = np.searchsorted(self.break_thresholds, worked, side='left') - 1
+        required_break = np.where(rule >= 0, self.break_minutes[np.maximum(rule, 0)], 0)
+
+        return np.maximum(worked - np.maximum(required_break - recorded, 0), 0)